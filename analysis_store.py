@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+État des analyses par analysis_id, borné et thread-safe
+• Réparti en shards (un verrou chacun) : une écriture ou un nettoyage ne
+  bloque que son shard, jamais tout le store
+• Analyses terminées (completed / error) expirées après `ttl` s sans mise à jour
+• Nombre max d'entrées et budget mémoire (taille JSON estimée) : les
+  analyses terminées les plus anciennes sont évincées en premier, les
+  analyses en file / en cours ne le sont jamais
+• Backend choisi par JOB_STORE : "memory" (défaut, propre au processus) ou
+  "sqlite" (fichier JOB_STORE_PATH en WAL, partagé par plusieurs workers
+  d'un même hôte)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+JOB_STORE = os.getenv("JOB_STORE", "memory").lower()
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.db")
+
+# Nettoyage du fichier partagé au plus toutes les SWEEP_INTERVAL s par processus
+SWEEP_INTERVAL = 10
+
+FINISHED = ("completed", "error")
+
+def _json_default(value):
+    # Scalaires numpy / pandas (ex. total_value) → types Python natifs
+    return value.item() if hasattr(value, "item") else str(value)
+
+def dumps(state) -> str:
+    return json.dumps(state, default=_json_default)
+
+def estimate_size(state) -> int:
+    """Taille approximative (octets) d'un état d'analyse, via sa forme JSON"""
+    try:
+        return len(dumps(state))
+    except (TypeError, ValueError):
+        return 0
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()   # id → (mis à jour le, taille, état), ordre des mises à jour
+        self.bytes = 0
+        self.evicted = 0
+
+class AnalysisStore:
+    """Mapping analysis_id → état, avec expiration et limites de taille
+
+    Les limites sont réparties également entre les shards et appliquées à
+    chaque écriture sur le shard concerné (nettoyage incrémental).
+    """
+
+    def __init__(self, ttl: float, max_entries: int, memory_budget: int, shards: int = 16):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_budget = memory_budget
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self._max_entries = max(1, max_entries // len(self._shards))
+        self._max_bytes = max(1, memory_budget // len(self._shards))
+
+    def _shard(self, analysis_id) -> _Shard:
+        return self._shards[zlib.crc32(str(analysis_id).encode()) % len(self._shards)]
+
+    def _expired(self, entry, now) -> bool:
+        return entry[2].get("status") in FINISHED and now - entry[0] > self.ttl
+
+    def __setitem__(self, analysis_id, state):
+        size = estimate_size(state)      # hors verrou
+        shard = self._shard(analysis_id)
+        with shard.lock:
+            old = shard.entries.pop(analysis_id, None)
+            if old is not None:
+                shard.bytes -= old[1]
+            shard.entries[analysis_id] = (time.time(), size, state)
+            shard.bytes += size
+            self._evict(shard)
+
+    def _evict(self, shard):
+        """Expirées d'abord, puis terminées les plus anciennes tant que le
+        shard dépasse ses limites (appelé sous le verrou du shard)"""
+        now = time.time()
+        count, size, victims = len(shard.entries), shard.bytes, []
+        for analysis_id, entry in shard.entries.items():
+            over = count > self._max_entries or size > self._max_bytes
+            if not over and now - entry[0] <= self.ttl:
+                break                    # entrées suivantes plus récentes
+            if entry[2].get("status") in FINISHED and (over or self._expired(entry, now)):
+                victims.append(analysis_id)
+                count, size = count - 1, size - entry[1]
+        for analysis_id in victims:
+            shard.bytes -= shard.entries.pop(analysis_id)[1]
+        shard.evicted += len(victims)
+
+    def __getitem__(self, analysis_id):
+        state = self.get(analysis_id)
+        if state is None:
+            raise KeyError(analysis_id)
+        return state
+
+    def get(self, analysis_id, default=None):
+        shard = self._shard(analysis_id)
+        with shard.lock:
+            entry = shard.entries.get(analysis_id)
+            if entry is None or self._expired(entry, time.time()):
+                return default
+            return entry[2]
+
+    def __contains__(self, analysis_id) -> bool:
+        return self.get(analysis_id) is not None
+
+    def __delitem__(self, analysis_id):
+        if self.pop(analysis_id, None) is None:
+            raise KeyError(analysis_id)
+
+    def pop(self, analysis_id, default=None):
+        shard = self._shard(analysis_id)
+        with shard.lock:
+            entry = shard.entries.pop(analysis_id, None)
+            if entry is None:
+                return default
+            shard.bytes -= entry[1]
+            return entry[2]
+
+    def patch(self, analysis_id, **fields):
+        """Met à jour quelques champs d'un état existant (ex. progress)"""
+        state = self.get(analysis_id)
+        if state is not None:
+            self[analysis_id] = {**state, **fields}
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def stats(self) -> dict:
+        """Taille courante, limites et nombre d'évictions"""
+        return {
+            "backend": "memory",
+            "size": len(self),
+            "bytes": sum(shard.bytes for shard in self._shards),
+            "max_entries": self.max_entries,
+            "memory_budget": self.memory_budget,
+            "ttl": self.ttl,
+            "evicted": sum(shard.evicted for shard in self._shards),
+        }
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id          TEXT    PRIMARY KEY,
+    status      TEXT    NOT NULL,
+    state       TEXT    NOT NULL,
+    size        INTEGER NOT NULL,
+    updated_at  REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_finished ON analyses (status, updated_at);
+"""
+
+class SQLiteAnalysisStore:
+    """Même interface qu'AnalysisStore, états stockés dans un fichier SQLite (WAL)
+
+    Plusieurs processus d'un même hôte partagent ainsi statut, progression
+    et résultats : un /api/status servi par un autre worker trouve l'analyse.
+    Les limites s'appliquent au fichier entier, nettoyé au plus toutes les
+    SWEEP_INTERVAL s par chaque processus.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int, memory_budget: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_budget = memory_budget
+        self.evicted = 0
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def __setitem__(self, analysis_id, state):
+        data = dumps(state)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?)",
+                             (analysis_id, state.get("status", ""), data, len(data), time.time()))
+        finally:
+            conn.close()
+        if time.time() - self._last_sweep >= SWEEP_INTERVAL:
+            self.sweep()
+
+    def get(self, analysis_id, default=None):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT state FROM analyses WHERE id = ? AND NOT "
+                "(status IN ('completed', 'error') AND updated_at < ?)",
+                (analysis_id, time.time() - self.ttl)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else default
+
+    def __getitem__(self, analysis_id):
+        state = self.get(analysis_id)
+        if state is None:
+            raise KeyError(analysis_id)
+        return state
+
+    def __contains__(self, analysis_id) -> bool:
+        return self.get(analysis_id) is not None
+
+    def __delitem__(self, analysis_id):
+        if self.pop(analysis_id, None) is None:
+            raise KeyError(analysis_id)
+
+    def pop(self, analysis_id, default=None):
+        state = self.get(analysis_id)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+        finally:
+            conn.close()
+        return default if state is None else state
+
+    def patch(self, analysis_id, **fields):
+        """Met à jour quelques champs d'un état existant (ex. progress)"""
+        state = self.get(analysis_id)
+        if state is not None:
+            self[analysis_id] = {**state, **fields}
+
+    def sweep(self):
+        """Supprime les analyses expirées, puis les plus anciennes terminées
+        tant que le fichier dépasse ses limites"""
+        if not self._sweep_lock.acquire(blocking=False):
+            return                       # nettoyage déjà en cours dans ce processus
+        try:
+            self._last_sweep = time.time()
+            conn = self._connect()
+            try:
+                with conn:
+                    # Expirées, et analyses sans mise à jour depuis ttl s : abandonnées
+                    # par un worker arrêté en cours d'analyse
+                    deleted = conn.execute("DELETE FROM analyses WHERE updated_at < ?",
+                                           (time.time() - self.ttl,)).rowcount
+                    count, size = conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses").fetchone()
+                    if count > self.max_entries or size > self.memory_budget:
+                        victims = []
+                        for analysis_id, entry_size in conn.execute(
+                                "SELECT id, size FROM analyses WHERE status IN ('completed', 'error') "
+                                "ORDER BY updated_at"):
+                            if count <= self.max_entries and size <= self.memory_budget:
+                                break
+                            victims.append((analysis_id,))
+                            count, size = count - 1, size - entry_size
+                        conn.executemany("DELETE FROM analyses WHERE id = ?", victims)
+                        deleted += len(victims)
+                self.evicted += deleted
+            finally:
+                conn.close()
+        finally:
+            self._sweep_lock.release()
+
+    def __len__(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """Taille courante, limites et nombre d'évictions (par ce processus)"""
+        conn = self._connect()
+        try:
+            count, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses").fetchone()
+        finally:
+            conn.close()
+        return {
+            "backend": "sqlite",
+            "size": count,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "memory_budget": self.memory_budget,
+            "ttl": self.ttl,
+            "evicted": self.evicted,
+        }
+
+def create_store(ttl: float, max_entries: int, memory_budget: int):
+    """Store des analyses selon JOB_STORE ("memory" ou "sqlite")"""
+    if JOB_STORE == "sqlite":
+        return SQLiteAnalysisStore(JOB_STORE_PATH, ttl, max_entries, memory_budget)
+    if JOB_STORE != "memory":
+        raise ValueError(f"JOB_STORE inconnu : {JOB_STORE} (memory ou sqlite)")
+    return AnalysisStore(ttl, max_entries, memory_budget)
@@ -1,23 +1,37 @@
-from flask import Flask, request, jsonify, render_template
+from __future__ import annotations
+
+from flask import Blueprint, Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 import os
 import sys
 import time
+import asyncio
 import datetime as dt
-import requests
-import pandas as pd
-import numpy as np
 from dotenv import load_dotenv
-from tqdm import tqdm
 import json
-from web3 import Web3
-from eth_account import Account
 import threading
-import queue
 import uuid
+from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from llama_prices import resolve_prices, NATIVE_TOKEN, PRICE_CACHE, PriceBook
+from singleflight import UPSTREAM
+from ttl_cache import TTLCache
+from balance_snapshots import balances_at_block, pinned_block, BALANCE_CACHE
+from fanout import fan_out, run_in_background, JobPool, QueueFull
+from analysis_store import create_store
+from notifier import ChangeNotifier
+import http_client
+import wallet_store
+import chain_scan
+
+# pandas, numpy, web3 et le moteur async (aiohttp) sont importés dans les
+# fonctions qui s'en servent : démarrage rapide des workers, et / ou
+# /api/chains ne les chargent jamais
 
-app = Flask(__name__)
-CORS(app)
+bp = Blueprint("wallet", __name__)
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Configuration
 load_dotenv()
@@ -48,12 +62,68 @@ CGK_HIST = "https://api.coingecko.com/api/v3/coins/{id}/market_chart"
 
 HEAD = {"User-Agent": "beta-portfolio/1.0"}
 
-# Stockage des résultats en cours
-active_analyses = {}
+# Pagination addresstokenbalance (Etherscan plafonne à 100 tokens par page)
+TOKEN_PAGE_SIZE = chain_scan.TOKEN_PAGE_SIZE
+MAX_TOKEN_PAGES = int(os.getenv("MAX_TOKEN_PAGES", "20"))
 
-import os
-from dotenv import load_dotenv
-load_dotenv()
+# Hôtes amont pré-chauffés au démarrage (HTTP_PREWARM=0 pour désactiver)
+PREWARM_URLS = ["https://api.etherscan.io/", "https://coins.llama.fi/",
+                "https://api.coingecko.com/", "https://api.covalenthq.com/"]
+
+# Moteur de scan : "threads" (défaut) ou "async" (boucle asyncio partagée)
+SCAN_ENGINE = os.getenv("SCAN_ENGINE", "threads").lower()
+
+# Analyse par lot (/api/analyze/batch) : taille max, wallets analysés en
+# parallèle par lot et lots simultanés (au-delà : 429)
+BATCH_MAX_WALLETS = int(os.getenv("BATCH_MAX_WALLETS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENT = int(os.getenv("BATCH_MAX_CONCURRENT", "2"))
+batch_slots = threading.BoundedSemaphore(BATCH_MAX_CONCURRENT)
+
+# Analyses /api/analyze : workers simultanés et analyses max en file d'attente
+# en plus de celles en cours (au-delà : 429 avec l'attente estimée). Moteur
+# async : ASYNC_MAX_ANALYSES analyses en vol sur la boucle partagée, un seul
+# thread pour les admettre (aucun thread bloqué par analyse)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "50"))
+ASYNC_MAX_ANALYSES = int(os.getenv("ASYNC_MAX_ANALYSES", "50"))
+if SCAN_ENGINE == "async":
+    ANALYSIS_POOL = JobPool(ASYNC_MAX_ANALYSES, ANALYSIS_QUEUE_SIZE, name="analysis", threads=1)
+else:
+    ANALYSIS_POOL = JobPool(ANALYSIS_WORKERS, ANALYSIS_QUEUE_SIZE, name="analysis")
+
+# Résultats par wallet (adresse normalisée) : frais pendant RESULT_FRESH_TTL s,
+# puis servis tels quels avec rafraîchissement en fond jusqu'à RESULT_MAX_AGE s
+RESULT_FRESH_TTL = int(os.getenv("RESULT_FRESH_TTL", "300"))
+RESULT_MAX_AGE = int(os.getenv("RESULT_MAX_AGE", "3600"))
+RESULT_CACHE = TTLCache(RESULT_MAX_AGE, int(os.getenv("RESULT_CACHE_SIZE", "10000")))   # wallet → (date, résultat)
+
+# Clés Idempotency-Key de /api/analyze : clé → (wallet, analysis_id)
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "3600"))
+IDEMPOTENCY_KEYS = TTLCache(IDEMPOTENCY_TTL, 10000)
+
+# Analyse en file / en cours par wallet (une seule à la fois par wallet)
+wallet_jobs = {}
+wallet_jobs_lock = threading.Lock()
+
+# Stockage des analyses (en file, en cours, terminées) : les terminées
+# expirent après ANALYSIS_TTL s, au plus ANALYSIS_MAX_ENTRIES analyses et
+# ANALYSIS_MEMORY_MB Mo (estimés) gardés ; en mémoire ou, avec
+# JOB_STORE=sqlite, dans un fichier partagé par plusieurs workers
+ANALYSIS_TTL = int(os.getenv("ANALYSIS_TTL", "3600"))
+ANALYSIS_MAX_ENTRIES = int(os.getenv("ANALYSIS_MAX_ENTRIES", "10000"))
+ANALYSIS_MEMORY_MB = int(os.getenv("ANALYSIS_MEMORY_MB", "256"))
+active_analyses = create_store(ANALYSIS_TTL, ANALYSIS_MAX_ENTRIES, ANALYSIS_MEMORY_MB * 1024 * 1024)
+
+# Réveille les flux SSE (et les lots) qui suivent une analyse à chaque mise à
+# jour de celle-ci : une condition par analyse suivie, pas de réveil global
+ANALYSIS_EVENTS = ChangeNotifier()
+
+# Flux SSE : relecture de l'état au moins toutes les SSE_POLL_INTERVAL s,
+# commentaire keep-alive toutes les SSE_HEARTBEAT s, durée max d'un flux
+SSE_POLL_INTERVAL = 1.0
+SSE_HEARTBEAT = 15
+SSE_MAX_DURATION = int(os.getenv("SSE_MAX_DURATION", "300"))
 
 # Configuration des APIs Etherscan multi-chaînes avec la nouvelle API v2
 ETHERSCAN_APIS = {
@@ -101,137 +171,266 @@ RPC_ENDPOINTS = {
 
 def price_llama(chain_id: int, addr: str) -> float:
     """Récupère le prix via DefiLlama"""
-    plat = CHAIN_TO_LLAMA.get(chain_id)
-    if not plat: 
-        return 0
-    url = f"https://coins.llama.fi/prices/current/{plat}:{addr}"
-    try:
-        r = requests.get(url, timeout=10)
-        return r.json()["coins"].get(f"{plat}:{addr}", {}).get("price", 0) if r.ok else 0
-    except:
-        return 0
+    return prices_llama(chain_id, [addr]).get(addr.lower(), 0)
 
-def get_balance_via_web3(chain_id, wallet_addr, token_addr, decimals):
-    """Obtenir le balance actuel via Web3"""
-    try:
-        rpc_url = RPC_ENDPOINTS.get(chain_id)
-        if not rpc_url:
-            return 0
-            
-        w3 = Web3(Web3.HTTPProvider(rpc_url))
-        if not w3.is_connected():
-            return 0
-            
-        abi = [{"constant":True,"inputs":[{"name":"_owner","type":"address"}],"name":"balanceOf","outputs":[{"name":"balance","type":"uint256"}],"type":"function"}]
-        
-        contract = w3.eth.contract(
-            address=Web3.to_checksum_address(token_addr),
-            abi=abi
-        )
-        balance = contract.functions.balanceOf(Web3.to_checksum_address(wallet_addr)).call()
-        return balance
-    except:
-        return 0
+def prices_llama(chain_id: int, addrs: list[str], price_book=None) -> dict:
+    """Récupère les prix de plusieurs tokens via DefiLlama en requêtes groupées
+    (prix fixés par price_book pour une analyse par lot)"""
+    if chain_id not in CHAIN_TO_LLAMA:
+        return {a.lower(): 0 for a in addrs}
+    return resolve_prices(chain_id, addrs, price_book)
 
 def get_native_balance(chain_id, wallet_addr):
-    """Obtenir le balance natif (ETH, BNB, etc.)"""
+    """Obtenir le balance natif (ETH, BNB, etc.) et le bloc de lecture
+    (0, None) si le RPC est indisponible ; bloc None si lu hors bloc épinglé"""
     try:
         rpc_url = RPC_ENDPOINTS.get(chain_id)
         if not rpc_url:
-            return 0
-            
-        w3 = Web3(Web3.HTTPProvider(rpc_url))
-        if not w3.is_connected():
-            return 0
+            return 0, None
             
-        balance = w3.eth.get_balance(Web3.to_checksum_address(wallet_addr))
-        return balance
-    except:
-        return 0
-
-def scan_chain_via_etherscan(chain_name, api_config, wallet_addr):
-    """Scanner une chaîne via l'API addresstokenbalance"""
-    results = []
-    
-    # 1. Vérifier le balance natif
-    try:
-        native_balance = get_native_balance(api_config["chain_id"], wallet_addr)
-        if native_balance > 0:
-            # Obtenir le prix du token natif
-            native_price = price_llama(api_config["chain_id"], "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee")
-            if native_price > 0:
-                native_value = native_balance / 10**18 * native_price
-                # Prendre tous les montants en compte
-                results.append({
-                    "addr": "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee",
-                    "sym": "ETH" if chain_name == "Ethereum" else f"Native-{chain_name}",
-                    "usd": native_value,
-                    "cid": api_config["chain_id"],
-                    "chain": chain_name
-                })
-                print(f"  ✅ Native: ${native_value:.2f}")
+        native, _, block = balances_at_block(chain_id, rpc_url, wallet_addr, [])
+        return native, block
     except Exception as e:
         print(f"  ❌ Erreur balance natif: {e}")
-    
-    # 2. Obtenir les tokens ERC20 via addresstokenbalance
+        return 0, None
+
+def fetch_token_page(api_config, wallet_addr, page=1):
+    """Une page addresstokenbalance d'un wallet (requêtes identiques en vol partagées)"""
+    params = chain_scan.token_page_params(api_config, wallet_addr, page)
+    key = ("etherscan_tokens", api_config["chain_id"], wallet_addr.lower(), page)
+    return UPSTREAM.do(key, http_client.get, api_config["url"], params=params, timeout=15,
+                       deadline=30, api_key=api_config["key"],
+                       retry_on=http_client.etherscan_rate_limited)
+
+def _token_page(chain_name, api_config, wallet_addr, page):
+    """(tokens, ok) d'une page ; liste vide en fin de liste, ok=False (avec
+    message) en cas d'erreur"""
     try:
-        params = {
-            "chainid": api_config["chain_id"],
-            "module": "account",
-            "action": "addresstokenbalance",
-            "address": wallet_addr,
-            "page": 1,
-            "offset": 100,
-            "apikey": api_config["key"]
-        }
-        
-        response = requests.get(api_config["url"], params=params, timeout=15)
+        response = fetch_token_page(api_config, wallet_addr, page)
         
         if response.ok:
             data = response.json()
-            if data.get("status") == "1":
-                tokens = data.get("result", [])
-                print(f"  📊 {len(tokens)} tokens trouvés via {chain_name}")
-                
-                for token in tokens:
-                    try:
-                        token_addr = token.get("TokenAddress", "").lower()
-                        symbol = token.get("TokenSymbol", "UNKNOWN")
-                        quantity = int(token.get("TokenQuantity", "0"))
-                        divisor = int(token.get("TokenDivisor", "18"))
-                        
-                        if quantity > 0:
-                            # Obtenir le prix
-                            price = price_llama(api_config["chain_id"], token_addr)
-                            if price > 0:
-                                usd_value = quantity / 10**divisor * price
-                                # Prendre tous les montants en compte
-                                results.append({
-                                    "addr": token_addr,
-                                    "sym": symbol,
-                                    "usd": usd_value,
-                                    "cid": api_config["chain_id"],
-                                    "chain": chain_name
-                                })
-                                print(f"  ✅ {symbol}: ${usd_value:.2f}")
-                            else:
-                                print(f"  ❌ {symbol}: Prix non trouvé")
-                                
-                    except Exception as e:
-                        print(f"  ❌ Erreur token: {e}")
-                        continue
-            else:
+            tokens, ok = chain_scan.parse_token_page(data)
+            if not ok:
                 print(f"  ⚠️  Erreur {chain_name}: {data.get('message', 'Erreur inconnue')}")
-        else:
-            print(f"  ❌ Erreur {chain_name}: {response.status_code}")
+            return tokens, ok
+        print(f"  ❌ Erreur {chain_name}: {response.status_code}")
             
     except Exception as e:
         print(f"  ❌ Erreur {chain_name}: {e}")
+    return [], False
+
+def iter_token_pages(chain_name, api_config, wallet_addr):
+    """Génère les pages addresstokenbalance (tokens, ok) au fil de l'eau
+    
+    La page suivante est téléchargée pendant que l'appelant traite la page
+    courante. S'arrête sur une page incomplète ou après MAX_TOKEN_PAGES pages.
+    """
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="token-page") as prefetch:
+        page = 1
+        pending = prefetch.submit(_token_page, chain_name, api_config, wallet_addr, page)
+        while pending is not None:
+            tokens, ok = pending.result()
+            pending = None
+            if len(tokens) >= TOKEN_PAGE_SIZE and page < MAX_TOKEN_PAGES:
+                page += 1
+                pending = prefetch.submit(_token_page, chain_name, api_config, wallet_addr, page)
+            yield tokens, ok
+
+def discover_chain_tokens(chain_name, api_config, wallet_addr):
+    """Découverte complète (toutes les pages) enregistrée dans l'index local
+    
+    La découverte n'est marquée terminée que si toutes les pages ont été lues
+    sans erreur. Les tokens sont datés du bloc épinglé de la chaîne.
+    """
+    chain_id = api_config["chain_id"]
+    block = None
+    try:
+        if RPC_ENDPOINTS.get(chain_id):
+            block = pinned_block(chain_id, RPC_ENDPOINTS[chain_id])
+    except Exception:
+        pass
+    found = {}
+    for page in range(1, MAX_TOKEN_PAGES + 1):
+        response = fetch_token_page(api_config, wallet_addr, page)
+        if not response.ok:
+            return
+        tokens, ok = chain_scan.parse_token_page(response.json())
+        if not ok:
+            return          # message d'erreur (clé, quota...)
+        found.update(wallet_store.index_entries(tokens, block))
+        if len(tokens) < TOKEN_PAGE_SIZE:
+            break
+    wallet_store.record_tokens(wallet_addr, chain_id, found, complete=True)
+    print(f"  📇 Index {chain_name}: {len(found)} tokens connus")
+
+def scan_chain_via_index(chain_name, api_config, wallet_addr, known, price_book=None):
+    """Positions d'une chaîne à partir des tokens de l'index : natif + tous les
+    balanceOf en quelques appels Multicall3, puis prix groupés
+    
+    Renvoie (positions, bloc de lecture), bloc None si lu à latest, ou None
+    si le RPC est indisponible (l'appelant repasse par l'API).
+    """
+    chain_id = api_config["chain_id"]
+    rpc_url = RPC_ENDPOINTS.get(chain_id)
+    if not rpc_url:
+        return None
+    try:
+        native_balance, current, block = balances_at_block(chain_id, rpc_url, wallet_addr,
+                                                           list(known))
+    except Exception as e:
+        print(f"  ❌ Erreur Multicall {chain_name}: {e}")
+        return None
+    print(f"  📇 {len(known)} tokens connus via l'index ({chain_name})")
+    
+    holdings = {addr: (known[addr]["symbol"], known[addr]["decimals"], quantity)
+                for addr, quantity in current.items()}
+    addrs = chain_scan.priced_addrs(native_balance, holdings)
+    prices = prices_llama(chain_id, addrs, price_book) if addrs else {}
+    return chain_scan.build_positions(chain_name, chain_id, native_balance, holdings,
+                                      prices), block
+
+def page_quantities(chain_id, wallet_addr, holdings):
+    """Quantités d'une page relues au bloc épinglé (Multicall3) : TokenQuantity
+    suit la hauteur de l'indexeur Etherscan, pas celle du natif
+    
+    Renvoie (holdings, bloc de lecture). Sans RPC ou en cas d'erreur, les
+    TokenQuantity de la page sont conservées (bloc None).
+    """
+    rpc_url = RPC_ENDPOINTS.get(chain_id)
+    if not rpc_url:
+        return holdings, None
+    try:
+        _, current, block = balances_at_block(chain_id, rpc_url, wallet_addr, list(holdings),
+                                              include_native=False)
+    except Exception as e:
+        print(f"  ⚠️  Quantités non épinglées ({e}), TokenQuantity Etherscan conservées")
+        return holdings, None
+    return chain_scan.pinned_holdings(holdings, current), block
+
+def scan_chain_via_etherscan(chain_name, api_config, wallet_addr, price_book=None):
+    """Scanner une chaîne via l'API addresstokenbalance (paginée, prix page par page)
+    
+    Si l'index local connaît déjà les tokens du wallet, on passe directement
+    au Multicall3 ; la découverte est alors rafraîchie en tâche de fond quand
+    elle a plus de DISCOVERY_MAX_AGE secondes. Sinon les quantités de chaque
+    page sont relues au même bloc épinglé que le natif.
+    
+    Renvoie (positions, bloc commun à toutes les lectures) ; bloc None si le
+    scan est incomplet (page ou balance en erreur) ou pas lu à un seul bloc
+    épinglé : ses positions ne doivent pas être enregistrées.
+    """
+    results = []
+    chain_id = api_config["chain_id"]
+    
+    known, refreshed_at = wallet_store.load_tokens(wallet_addr, chain_id)
+    if known or refreshed_at is not None:
+        if wallet_store.discovery_stale(refreshed_at):
+            run_in_background(("discovery", chain_id, wallet_addr.lower()),
+                              discover_chain_tokens, chain_name, api_config, wallet_addr)
+        indexed = scan_chain_via_index(chain_name, api_config, wallet_addr, known, price_book)
+        if indexed is not None:
+            return indexed
+    
+    # 1. Vérifier le balance natif (blocks : blocs des lectures, None = échec
+    #    ou lecture hors bloc épinglé)
+    native_balance, block = get_native_balance(chain_id, wallet_addr)
+    blocks = {block}
+    
+    # 2. Tokens ERC20 page par page : les prix d'une page sont résolus
+    #    pendant le téléchargement de la suivante
+    pages = iter_token_pages(chain_name, api_config, wallet_addr)
+    for page_no, (tokens, ok) in enumerate(pages, start=1):
+        if not ok:
+            blocks.add(None)
+        holdings = chain_scan.page_holdings(tokens)
+        if holdings:
+            holdings, block = page_quantities(chain_id, wallet_addr, holdings)
+            blocks.add(block)
+        if tokens:
+            print(f"  📊 {len(tokens)} tokens trouvés via {chain_name} (page {page_no})")
+            wallet_store.record_tokens(wallet_addr, chain_id,
+                                       wallet_store.index_entries(tokens, block))
+        
+        # 3. Résoudre les prix de la page en quelques requêtes groupées
+        native = native_balance if page_no == 1 else 0
+        addrs = chain_scan.priced_addrs(native, holdings)
+        prices = prices_llama(chain_id, addrs, price_book) if addrs else {}
+        results.extend(chain_scan.build_positions(chain_name, chain_id, native, holdings, prices))
+    
+    return results, blocks.pop() if len(blocks) == 1 else None
+
+def rpc_batch(rpc_url, calls):
+    """Exécute des (méthode, params) en une requête JSON-RPC batch ; résultats
+    dans l'ordre des appels, ValueError si l'un d'eux échoue"""
+    replies = http_client.post(rpc_url, json=chain_scan.rpc_batch_payload(calls),
+                               timeout=10).json()
+    return chain_scan.rpc_batch_results(replies, len(calls))
+
+def chain_fingerprint(api_config, wallet_addr, block=None):
+    """Empreinte d'état d'une chaîne lue à un bloc (bloc épinglé par défaut) :
+    ((nonce, dernier bloc de transfert ERC20, balance natif), bloc). Empreinte
+    None si un élément est indisponible (pas de réutilisation)."""
+    chain_id = api_config["chain_id"]
+    rpc_url = RPC_ENDPOINTS.get(chain_id)
+    if not rpc_url or not api_config["key"]:
+        return None, block
+    try:
+        if block is None:
+            block = pinned_block(chain_id, rpc_url)
+        # Nonce et balance natif en un seul aller-retour (batch JSON-RPC)
+        nonce, native_balance = rpc_batch(rpc_url,
+                                          chain_scan.fingerprint_rpc_calls(wallet_addr, block))
+        response = http_client.get(api_config["url"],
+                                   params=chain_scan.last_transfer_params(api_config, wallet_addr,
+                                                                          block),
+                                   timeout=10, api_key=api_config["key"],
+                                   retry_on=http_client.etherscan_rate_limited)
+        return chain_scan.parse_fingerprint(nonce, native_balance, response.json()), block
+    except Exception:
+        return None, block
+
+def chain_positions(chain_name, api_config, wallet_addr, price_book=None):
+    """Positions d'une chaîne ; celles du dernier scan sont réutilisées
+    (revalorisées aux prix courants) si l'empreinte n'a pas changé
     
+    Sans instantané récent, l'empreinte n'est relevée que pour enregistrer
+    celui du scan, en parallèle de ce dernier (aucun aller-retour en plus).
+    Seul un scan complet, lu à un bloc épinglé, est enregistré, avec
+    l'empreinte relevée à ce même bloc.
+    """
+    chain_id = api_config["chain_id"]
+    snapshot = wallet_store.load_snapshot(wallet_addr, chain_id)
+    if wallet_store.snapshot_fresh(snapshot):
+        fingerprint, at_block = chain_fingerprint(api_config, wallet_addr)
+        if wallet_store.snapshot_matches(snapshot, fingerprint):
+            positions = snapshot[1]
+            print(f"  ♻️  {chain_name} inchangée : {len(positions)} positions réutilisées")
+            prices = (prices_llama(chain_id, [p["addr"] for p in positions], price_book)
+                      if positions else {})
+            return wallet_store.reprice_positions(positions, prices)
+        results, block = scan_chain_via_etherscan(chain_name, api_config, wallet_addr,
+                                                  price_book)
+    else:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="fingerprint") as pool:
+            pending = pool.submit(chain_fingerprint, api_config, wallet_addr)
+            results, block = scan_chain_via_etherscan(chain_name, api_config, wallet_addr,
+                                                  price_book)
+            fingerprint, at_block = pending.result()
+    if block is not None and fingerprint is not None and at_block != block:
+        # Bloc épinglé renouvelé pendant le scan : empreinte relue au bloc du scan
+        fingerprint, _ = chain_fingerprint(api_config, wallet_addr, block)
+    if fingerprint is not None and block is not None:
+        # Prix du scan (déjà en cache) conservés pour revaloriser plus tard
+        prices = (prices_llama(chain_id, [r["addr"] for r in results], price_book)
+                  if results else {})
+        wallet_store.save_snapshot(wallet_addr, chain_id, fingerprint,
+                                   [dict(r, price=prices.get(r["addr"], 0)) for r in results])
     return results
 
 def balances(addr: str, cid: int) -> pd.DataFrame:
     """Récupère les balances d'un wallet sur une chaîne - Solution Multi-Chaînes"""
+    import pandas as pd
     rows = []
     
     # Mapper les chain IDs vers les noms
@@ -250,7 +449,7 @@ def balances(addr: str, cid: int) -> pd.DataFrame:
         # Utiliser l'API Etherscan pour cette chaîne
         api_config = ETHERSCAN_APIS[chain_name]
         print(f"🔍 Analyse de {chain_name} via API Etherscan...")
-        results = scan_chain_via_etherscan(chain_name, api_config, addr)
+        results = chain_positions(chain_name, api_config, addr)
         rows.extend(results)
     else:
         # Fallback vers la méthode originale pour les autres chaînes
@@ -266,66 +465,65 @@ def balances(addr: str, cid: int) -> pd.DataFrame:
         
         rpc_urls = rpc_endpoints.get(cid, [])
         if rpc_urls:
-            w3 = None
-            for rpc_url in rpc_urls:
-                try:
-                    from web3 import Web3
-                    w3 = Web3(Web3.HTTPProvider(rpc_url))
-                    if w3.is_connected():
-                        break
-                except:
-                    continue
-            
-            if w3 and w3.is_connected():
-                # Balance ETH natif
-                try:
-                    eth_balance = w3.eth.get_balance(Web3.to_checksum_address(addr))
-                    if eth_balance > 0:
-                        eth_price = price_llama(cid, "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee")
-                        if eth_price > 0:
-                            eth_value = eth_balance / 10**18 * eth_price
-                            # Prendre tous les montants en compte
-                            rows.append({
-                                "addr": "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee",
-                                "sym": "ETH" if cid == 1 else f"ETH-{CHAIN_MAP[cid]}",
-                                "usd": eth_value,
-                                "cid": cid,
-                                "chain": CHAIN_MAP.get(cid, f"Chain {cid}")
-                            })
-                            print(f"  ✅ ETH: ${eth_value:.2f}")
-                except Exception as e:
-                    print(f"  ❌ Erreur ETH: {e}")
-    
+            # Balance ETH natif (premier endpoint sain, repli sur les suivants)
+            try:
+                eth_balance = balances_at_block(cid, rpc_urls, addr, [])[0]
+                if eth_balance > 0:
+                    eth_price = price_llama(cid, NATIVE_TOKEN)
+                    if eth_price > 0:
+                        eth_value = eth_balance / 10**18 * eth_price
+                        # Prendre tous les montants en compte
+                        rows.append({
+                            "addr": NATIVE_TOKEN,
+                            "sym": "ETH" if cid == 1 else f"ETH-{CHAIN_MAP[cid]}",
+                            "usd": eth_value,
+                            "cid": cid,
+                            "chain": CHAIN_MAP.get(cid, f"Chain {cid}")
+                        })
+                        print(f"  ✅ ETH: ${eth_value:.2f}")
+            except Exception as e:
+                print(f"  ❌ Erreur ETH: {e}")
+
     return pd.DataFrame(rows)
 
 def cgk_hist(id_, days):
     """Récupère l'historique des prix via CoinGecko"""
+    import pandas as pd
     try:
-        r = requests.get(CGK_HIST.format(id=id_),
-                        params={"vs_currency":"usd","days":days}, timeout=30)
-        r.raise_for_status()
-        d = pd.DataFrame(r.json()["prices"], columns=["ts","p"])
-        d["date"] = pd.to_datetime(d.ts, unit="ms").dt.date
-        return d.groupby("date").p.first().pct_change().dropna()
+        return UPSTREAM.do(("cgk_hist", id_, days), _cgk_hist, id_, days)
     except:
         return pd.Series()
 
+def _cgk_hist(id_, days):
+    import pandas as pd
+    r = http_client.get(CGK_HIST.format(id=id_),
+                        params={"vs_currency":"usd","days":days}, timeout=30, deadline=60)
+    r.raise_for_status()
+    d = pd.DataFrame(r.json()["prices"], columns=["ts","p"])
+    d["date"] = pd.to_datetime(d.ts, unit="ms").dt.date
+    return d.groupby("date").p.first().pct_change().dropna()
+
 def hist_prices(cid: int, addrs: list[str], start: dt.date, end: dt.date) -> pd.DataFrame:
     """Récupère l'historique des prix"""
+    import pandas as pd
     if not COV_KEY:
         return pd.DataFrame()
-        
+    key = ("cov_hist", cid, tuple(addrs), str(start), str(end))
+    return UPSTREAM.do(key, _hist_prices, cid, addrs, start, end)
+
+def _hist_prices(cid: int, addrs: list[str], start: dt.date, end: dt.date) -> pd.DataFrame:
+    import pandas as pd
     url = COV_HIST.format(chain=cid, addr_csv=",".join(addrs))
     try:
-        r = requests.get(url, params={"from": start, "to": end, "key": COV_KEY},
-                        headers=HEAD, timeout=60)
+        r = http_client.get(url, params={"from": start, "to": end, "key": COV_KEY},
+                            headers=HEAD, timeout=60, deadline=90, api_key=COV_KEY)
         if r.status_code == 404:
             frames = []
             for a in addrs:
                 try:
-                    g = requests.get(
+                    g = http_client.get(
                         f"https://api.coingecko.com/api/v3/coins/ethereum/contract/{a}/market_chart",
-                        params={"vs_currency":"usd","days":DAYS}, timeout=30)
+                        params={"vs_currency":"usd","days":DAYS}, timeout=30, deadline=60)
                     if g.ok:
                         df = pd.DataFrame(g.json()["prices"], columns=["ts","price"])
                         df["date"] = pd.to_datetime(df.ts, unit="ms").dt.date
@@ -347,42 +545,44 @@ def hist_prices(cid: int, addrs: list[str], start: dt.date, end: dt.date) -> pd.
 
 def beta(x, y): 
     """Calcule le beta entre deux séries"""
+    import numpy as np
     return np.cov(x, y)[0,1]/np.var(y) if np.var(y) else 0
 
 def calculate_beta_score(wallet_address: str, analysis_id: str):
     """Calcule le beta score pour un wallet"""
+    import pandas as pd
+    import numpy as np
     try:
         active_analyses[analysis_id] = {"status": "processing", "progress": 0}
         
         # 1) Récupération des balances multichain
-        active_analyses[analysis_id]["progress"] = 10
-        frames = [balances(wallet_address, cid) for cid in CHAIN_MAP]
-        df = pd.concat(frames, ignore_index=True)
+        active_analyses.patch(analysis_id, progress=10)
+        frames, debug_info = {}, []
+        for cid, frame, error in fan_out(lambda c: balances(wallet_address, c), CHAIN_MAP):
+            if error is not None:
+                debug_info.append(f"{CHAIN_MAP[cid]}: Erreur - {str(error)}")
+            else:
+                frames[cid] = frame
+                debug_info.append(f"{CHAIN_MAP[cid]}: {len(frame)} positions trouvées")
+        df = pd.concat([frames[cid] for cid in CHAIN_MAP if cid in frames] or [pd.DataFrame()],
+                       ignore_index=True)
         
         if df.empty:
-            # Essayer de diagnostiquer le problème
-            debug_info = []
-            for cid in CHAIN_MAP:
-                try:
-                    test_df = balances(wallet_address, cid)
-                    debug_info.append(f"{CHAIN_MAP[cid]}: {len(test_df)} positions trouvées")
-                except Exception as e:
-                    debug_info.append(f"{CHAIN_MAP[cid]}: Erreur - {str(e)}")
-            
+            # Diagnostic collecté pendant le scan parallèle
             active_analyses[analysis_id] = {
                 "status": "error", 
                 "message": f"Aucune position ≥ 10 USD trouvée. Debug: {'; '.join(debug_info)}"
             }
             return
             
-        active_analyses[analysis_id]["progress"] = 30
+        active_analyses.patch(analysis_id, progress=30)
         
         # Top positions
         top = (df.sort_values("usd", ascending=False)
                .head(MAX_TOKENS).reset_index(drop=True))
         
         # 2) Historiques des prix
-        active_analyses[analysis_id]["progress"] = 50
+        active_analyses.patch(analysis_id, progress=50)
         end, start = dt.date.today(), dt.date.today() - dt.timedelta(days=DAYS)
         hist = pd.concat([hist_prices(cid,
                                     top.query("cid==@cid").addr.tolist(),
@@ -391,11 +591,11 @@ def calculate_beta_score(wallet_address: str, analysis_id: str):
                         ignore_index=True)
         
         # 3) Benchmarks
-        active_analyses[analysis_id]["progress"] = 70
+        active_analyses.patch(analysis_id, progress=70)
         bench = {k: cgk_hist(v, DAYS) for k, v in BENCHMARKS.items()}
         
         # 4) Beta individuels
-        active_analyses[analysis_id]["progress"] = 85
+        active_analyses.patch(analysis_id, progress=85)
         for k in BENCHMARKS: 
             top[f"β_{k}"] = np.nan
             
@@ -407,7 +607,7 @@ def calculate_beta_score(wallet_address: str, analysis_id: str):
                 top.loc[idx, f"β_{k}"] = beta(a[0], a[1])
         
         # 5) Beta portefeuille
-        active_analyses[analysis_id]["progress"] = 95
+        active_analyses.patch(analysis_id, progress=95)
         weights = top.usd / top.usd.sum()
         beta_port = {k: (weights * top[f"β_{k}"]).sum() for k in BENCHMARKS}
         
@@ -444,6 +644,7 @@ def calculate_beta_score(wallet_address: str, analysis_id: str):
 
 def calculate_beta(token_returns, benchmark_returns):
     """Calcule le beta d'un token par rapport à un benchmark"""
+    import numpy as np
     if len(token_returns) < 30 or len(benchmark_returns) < 30:
         return 1.0  # Beta par défaut si pas assez de données
     
@@ -460,7 +661,7 @@ def calculate_beta(token_returns, benchmark_returns):
     except:
         return 1.0
 
-def calculate_wallet_score(tokens_df):
+def calculate_wallet_score(tokens_df, verbose=True):
     """Calcule le score du wallet basé sur la volatilité des tokens"""
     if tokens_df.empty:
         return {"score": 0, "details": "Aucun token trouvé"}
@@ -517,7 +718,8 @@ def calculate_wallet_score(tokens_df):
             'type': 'stable' if symbol in stable_tokens else 'volatile' if symbol in volatile_tokens else 'normal'
         })
         
-        print(f"  📊 {token['sym']}: ${value:.2f} | Score = {score:.1f} | Type = {scores[-1]['type']}")
+        if verbose:
+            print(f"  📊 {token['sym']}: ${value:.2f} | Score = {score:.1f} | Type = {scores[-1]['type']}")
     
     if scores:
         total_score = sum(s['weighted_score'] for s in scores)
@@ -541,33 +743,75 @@ def calculate_wallet_score(tokens_df):
     else:
         return {"score": 50, "details": "Calcul impossible, score par défaut"}
 
-def analyze_wallet(wallet_address):
-    """Analyse complète d'un wallet : tokens + beta + score"""
+def analyze_wallet(wallet_address, on_chain=None, price_book=None):
+    """Analyse complète d'un wallet : tokens + beta + score
+    
+    on_chain(nom, positions par chaîne) est appelé dès qu'une chaîne est
+    terminée, avec les positions de toutes les chaînes terminées jusque-là.
+    price_book (PriceBook) fixe les prix pour toutes les analyses d'un lot.
+    """
+    if SCAN_ENGINE == "async":
+        import async_engine
+        return async_engine.ENGINE.run(analyze_wallet_async(wallet_address, on_chain,
+                                                            price_book))
+    
     print(f"🔍 Analyse complète du wallet: {wallet_address}")
     print("=" * 60)
     
-    all_tokens = []
+    # Scanner toutes les chaînes en parallèle, fusion au fil des résultats
+    by_chain = {}
+    for chain_name, results, error in fan_out(
+            lambda name: chain_positions(name, ETHERSCAN_APIS[name], wallet_address, price_book),
+            ETHERSCAN_APIS):
+        if error is not None:
+            print(f"❌ Erreur pour {chain_name}: {error}")
+        by_chain[chain_name] = results or []
+        if on_chain:
+            on_chain(chain_name, by_chain)
     
-    # Scanner toutes les chaînes
-    for chain_name, api_config in ETHERSCAN_APIS.items():
-        try:
-            results = scan_chain_via_etherscan(chain_name, api_config, wallet_address)
-            all_tokens.extend(results)
-        except Exception as e:
-            print(f"❌ Erreur pour {chain_name}: {e}")
+    return wallet_result(merge_chains(by_chain))
+
+async def analyze_wallet_async(wallet_address, on_chain=None, price_book=None):
+    """Analyse complète d'un wallet avec le moteur asyncio (même sortie)"""
+    import async_engine
+    print(f"🔍 Analyse complète du wallet: {wallet_address}")
+    print("=" * 60)
     
+    by_chain = {}
+    by_chain_lock = threading.Lock()
+    
+    def chain_done(chain_name, results):
+        # Appelé dans un thread par chaîne : publications partielles une à la fois
+        with by_chain_lock:
+            by_chain[chain_name] = results or []
+            if on_chain:
+                on_chain(chain_name, dict(by_chain))
+    
+    await async_engine.scan_wallet(wallet_address, ETHERSCAN_APIS, RPC_ENDPOINTS,
+                                   set(CHAIN_TO_LLAMA), MAX_TOKEN_PAGES, chain_done, price_book)
+    # Score (pandas) hors boucle : ne bloque pas les scans des autres analyses
+    return await asyncio.to_thread(wallet_result, merge_chains(by_chain))
+
+def merge_chains(by_chain):
+    """Positions de toutes les chaînes terminées, dans l'ordre de ETHERSCAN_APIS"""
+    return [t for chain_name in ETHERSCAN_APIS for t in by_chain.get(chain_name, [])]
+
+def wallet_result(all_tokens, verbose=True):
+    """Score et résultat à partir des positions des chaînes (toutes ou déjà terminées)"""
+    import pandas as pd
     if not all_tokens:
         return {"error": "Aucun token trouvé"}
     
     # Créer le DataFrame
     tokens_df = pd.DataFrame(all_tokens)
     
-    print("\n" + "=" * 60)
-    print("📈 CALCUL DU SCORE")
-    print("=" * 60)
+    if verbose:
+        print("\n" + "=" * 60)
+        print("📈 CALCUL DU SCORE")
+        print("=" * 60)
     
     # Calculer le score
-    score_result = calculate_wallet_score(tokens_df)
+    score_result = calculate_wallet_score(tokens_df, verbose)
     
     return {
         "tokens": tokens_df.to_dict('records'),
@@ -575,108 +819,446 @@ def analyze_wallet(wallet_address):
         "score": score_result
     }
 
-@app.route('/')
+def set_analysis(analysis_id, state):
+    """Met à jour l'état d'une analyse et réveille les flux SSE en attente
+    
+    L'écriture du store (SQLite avec JOB_STORE=sqlite) se fait hors de tout
+    verrou ; seuls les observateurs de cette analyse sont réveillés.
+    """
+    active_analyses[analysis_id] = state
+    ANALYSIS_EVENTS.notify(analysis_id)
+
+@bp.route('/')
 def index():
     """Page principale"""
     return render_template('index.html')
 
-@app.route('/api/analyze', methods=['POST'])
+def reserve_analysis(wallet, status="queued"):
+    """Crée une analyse (état initial publié) et lui réserve le wallet
+    
+    Renvoie (analysis_id, True), ou (analysis_id de l'analyse déjà en file /
+    en cours pour ce wallet, False) ; l'analyse créée est alors abandonnée.
+    """
+    analysis_id = str(uuid.uuid4())
+    set_analysis(analysis_id, {
+        "status": status,
+        "timestamp": time.time()
+    })
+    
+    with wallet_jobs_lock:
+        existing = wallet_jobs.get(wallet)
+        if existing is None:
+            wallet_jobs[wallet] = analysis_id
+    if existing is not None:
+        active_analyses.pop(analysis_id, None)
+        return existing, False
+    return analysis_id, True
+
+def release_wallet(wallet, analysis_id):
+    """Libère la réservation du wallet si elle appartient encore à cette analyse"""
+    with wallet_jobs_lock:
+        if wallet_jobs.get(wallet) == analysis_id:
+            del wallet_jobs[wallet]
+
+def store_analysis(wallet, analysis_id, result=None, error=None):
+    """Publie l'état final d'une analyse (résultat mis en cache) et libère le wallet"""
+    if error is None:
+        if "error" not in result:
+            RESULT_CACHE.set(wallet, (time.time(), result))
+        set_analysis(analysis_id, {
+            "status": "completed",
+            "result": result,
+            "timestamp": time.time()
+        })
+    else:
+        set_analysis(analysis_id, {
+            "status": "error",
+            "error": str(error),
+            "timestamp": time.time()
+        })
+    release_wallet(wallet, analysis_id)
+
+def submit_analysis(wallet):
+    """Met en file l'analyse d'un wallet (adresse normalisée)
+    
+    Renvoie (analysis_id, position dans la file), avec position None si une
+    analyse de ce wallet était déjà en file / en cours (son analysis_id est
+    renvoyé) ; QueueFull si la file est pleine. Le résultat alimente
+    RESULT_CACHE. wallet_jobs_lock n'est pris que pour réserver le wallet,
+    jamais pendant les écritures du store.
+    """
+    # Statut initialisé avant la mise en file (l'analyse peut démarrer tout de suite)
+    analysis_id, reserved = reserve_analysis(wallet)
+    if not reserved:
+        return analysis_id, None
+    
+    def publish_partial(chain_name, by_chain):
+        # Positions et score provisoires dès qu'une chaîne est terminée
+        state = {
+            "status": "running",
+            "partial": True,
+            "chains_done": [name for name in ETHERSCAN_APIS if name in by_chain],
+            "chains_total": len(ETHERSCAN_APIS),
+            "progress": round(100 * len(by_chain) / len(ETHERSCAN_APIS)),
+            "timestamp": time.time()
+        }
+        all_tokens = merge_chains(by_chain)
+        if all_tokens:
+            state["result"] = wallet_result(all_tokens, verbose=False)
+        set_analysis(analysis_id, state)
+    
+    def run_analysis():
+        set_analysis(analysis_id, {
+            "status": "running",
+            "timestamp": time.time()
+        })
+        if SCAN_ENGINE == "async":
+            # Planifiée sur la boucle partagée : le pool garde le créneau
+            # jusqu'à la fin de la Future, sans thread en attente
+            import async_engine
+            return async_engine.ENGINE.submit(run_analysis_async())
+        try:
+            store_analysis(wallet, analysis_id, analyze_wallet(wallet, publish_partial))
+        except Exception as e:
+            store_analysis(wallet, analysis_id, error=e)
+    
+    async def run_analysis_async():
+        try:
+            result = await analyze_wallet_async(wallet, publish_partial)
+        except Exception as e:
+            await asyncio.to_thread(store_analysis, wallet, analysis_id, error=e)
+        else:
+            await asyncio.to_thread(store_analysis, wallet, analysis_id, result)
+    
+    # Pool fixe de workers : une rafale de requêtes attend en file au lieu
+    # de créer un thread par analyse
+    try:
+        position = ANALYSIS_POOL.submit(analysis_id, run_analysis)
+    except QueueFull:
+        release_wallet(wallet, analysis_id)
+        active_analyses.pop(analysis_id, None)
+        raise
+    return analysis_id, position
+
+def start_analysis(wallet):
+    """Résultat en cache, analyse en cours ou nouvelle analyse pour un wallet
+    
+    Renvoie (réponse JSON, code HTTP).
+    """
+    cached = RESULT_CACHE.get(wallet)
+    if cached is not None:
+        computed_at, result = cached
+        age = time.time() - computed_at
+        stale = age > RESULT_FRESH_TTL
+        with wallet_jobs_lock:
+            refreshing = wallet in wallet_jobs
+        if stale and not refreshing:
+            # Stale-while-revalidate : résultat servi tout de suite, rafraîchi en fond
+            try:
+                submit_analysis(wallet)
+            except QueueFull:
+                pass
+        analysis_id = str(uuid.uuid4())
+        set_analysis(analysis_id, {
+            "status": "completed",
+            "result": result,
+            "timestamp": time.time()
+        })
+        return {
+            "analysis_id": analysis_id,
+            "status": "completed",
+            "cached": True,
+            "stale": stale,
+            "age": round(age)
+        }, 200
+    
+    with wallet_jobs_lock:
+        analysis_id = wallet_jobs.get(wallet)
+    position = None
+    if analysis_id is None:
+        try:
+            analysis_id, position = submit_analysis(wallet)
+        except QueueFull as e:
+            return {
+                "error": "Trop d'analyses en cours, réessayez plus tard",
+                "retry_after": e.retry_after
+            }, 429
+    if position is None:
+        # Même wallet déjà en file / en cours : on suit cette analyse
+        return {
+            "analysis_id": analysis_id,
+            "status": "started",
+            "attached": True
+        }, 200
+    return {
+        "analysis_id": analysis_id,
+        "status": "started",
+        "queue_position": position,
+        "estimated_wait": ANALYSIS_POOL.estimated_wait(position)
+    }, 200
+
+@bp.route('/api/analyze', methods=['POST'])
 def analyze_wallet_api():
-    """API pour analyser un wallet"""
+    """API pour analyser un wallet
+    
+    En-tête Idempotency-Key optionnel : une requête rejouée avec la même clé
+    renvoie la même analyse au lieu d'en lancer une nouvelle.
+    """
     data = request.get_json()
     wallet_address = data.get('wallet_address')
     
     if not wallet_address:
         return jsonify({"error": "Adresse wallet requise"}), 400
     
-    # Générer un ID unique pour cette analyse
-    analysis_id = str(uuid.uuid4())
+    wallet = wallet_address.strip().lower()
+    idempotency_key = request.headers.get("Idempotency-Key")
     
-    # Démarrer l'analyse en arrière-plan
-    def run_analysis():
-        try:
-            result = analyze_wallet(wallet_address)
-            active_analyses[analysis_id] = {
-                "status": "completed",
-                "result": result,
-                "timestamp": time.time()
-            }
-        except Exception as e:
-            active_analyses[analysis_id] = {
-                "status": "error",
-                "error": str(e),
-                "timestamp": time.time()
-            }
+    if idempotency_key:
+        known = IDEMPOTENCY_KEYS.get(idempotency_key)
+        if known is not None:
+            known_wallet, analysis_id = known
+            if known_wallet != wallet:
+                return jsonify({"error": "Clé d'idempotence déjà utilisée pour un autre wallet"}), 409
+            if analysis_id in active_analyses:
+                return jsonify({
+                    "analysis_id": analysis_id,
+                    "status": "started",
+                    "replayed": True
+                })
     
-    # Lancer l'analyse dans un thread séparé
-    thread = threading.Thread(target=run_analysis)
-    thread.start()
+    # Rejeu concurrent d'une même clé : dédupliqué par wallet_jobs (même analyse)
+    payload, code = start_analysis(wallet)
+    if idempotency_key and code == 200:
+        IDEMPOTENCY_KEYS.set(idempotency_key, (wallet, payload["analysis_id"]))
     
-    # Initialiser le statut
-    active_analyses[analysis_id] = {
-        "status": "running",
-        "timestamp": time.time()
-    }
+    response = jsonify(payload)
+    if code == 429:
+        response.headers["Retry-After"] = str(payload["retry_after"])
+    return response, code
+
+def prefetch_batch_prices(wallets, price_book):
+    """Prix de l'union des tokens des derniers instantanés de tous les wallets
+    du lot, en requêtes groupées, fixés dans price_book : les analyses du lot
+    s'en servent jusqu'à la fin du lot (un token partagé n'est résolu qu'une
+    fois, quelle que soit la durée du lot)"""
+    for api_config in ETHERSCAN_APIS.values():
+        chain_id = api_config["chain_id"]
+        if chain_id not in CHAIN_TO_LLAMA:
+            continue
+        tokens = wallet_store.snapshot_tokens(wallets, chain_id)
+        if tokens:
+            tokens.add(NATIVE_TOKEN)
+            prices_llama(chain_id, sorted(tokens), price_book)
+
+def wait_analysis(analysis_id):
+    """Attend la fin d'une analyse en file / en cours et renvoie son état final"""
+    with ANALYSIS_EVENTS.watch(analysis_id) as watch:
+        while True:
+            seen = watch.current()
+            analysis = active_analyses.get(analysis_id)
+            if analysis is None or analysis["status"] in ("completed", "error"):
+                return analysis
+            watch.wait(seen, timeout=SSE_POLL_INTERVAL)
+
+def batch_result(wallet, price_book=None):
+    """Résultat d'un wallet du lot : cache de résultats frais, analyse déjà
+    en file / en cours pour ce wallet, ou nouvelle analyse (mise en cache)
     
-    return jsonify({
-        "analysis_id": analysis_id,
-        "status": "started"
-    })
+    La nouvelle analyse réserve le wallet comme /api/analyze : une requête
+    /api/analyze concurrente suit cette analyse au lieu d'en lancer une autre.
+    """
+    cached = RESULT_CACHE.get(wallet)
+    if cached is not None and time.time() - cached[0] <= RESULT_FRESH_TTL:
+        return cached[1]
+    
+    analysis_id, reserved = reserve_analysis(wallet, "running")
+    if not reserved:
+        analysis = wait_analysis(analysis_id)
+        if analysis is not None and analysis["status"] == "completed":
+            return analysis["result"]
+        # Analyse suivie en échec : nouvelle tentative, réservée si possible
+        analysis_id, reserved = reserve_analysis(wallet, "running")
+    
+    try:
+        # Pas de résultats partiels : le lot ne renvoie que le résultat final
+        result = analyze_wallet(wallet, price_book=price_book)
+    except Exception as e:
+        if reserved:
+            store_analysis(wallet, analysis_id, error=e)
+        raise
+    if reserved:
+        store_analysis(wallet, analysis_id, result)
+    elif "error" not in result:
+        RESULT_CACHE.set(wallet, (time.time(), result))
+    return result
 
-@app.route('/api/status/<analysis_id>')
-def get_analysis_status(analysis_id):
-    """Obtenir le statut d'une analyse"""
-    if analysis_id not in active_analyses:
-        return jsonify({"error": "Analyse non trouvée"}), 404
+@bp.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch_api():
+    """API pour analyser un lot de wallets : résultats en NDJSON, une ligne
+    par wallet dès que son analyse est terminée"""
+    data = request.get_json(silent=True) or {}
+    wallets = data.get('wallets')
+    if not isinstance(wallets, list) or not wallets:
+        return jsonify({"error": "Liste de wallets requise"}), 400
+    wallets = list(dict.fromkeys(str(w).strip().lower() for w in wallets if w))
+    if len(wallets) > BATCH_MAX_WALLETS:
+        return jsonify({"error": f"Maximum {BATCH_MAX_WALLETS} wallets par lot"}), 400
+    if not batch_slots.acquire(blocking=False):
+        response = jsonify({"error": "Trop de lots en cours, réessayez plus tard",
+                            "retry_after": ANALYSIS_POOL.estimated_wait(1)})
+        response.headers["Retry-After"] = str(ANALYSIS_POOL.estimated_wait(1))
+        return response, 429
     
-    analysis = active_analyses[analysis_id]
+    def generate():
+        # Client déconnecté : fan_out est fermé, les wallets restants ne sont pas lancés
+        # Prix fixés pour tout le lot (PriceBook), pas seulement le TTL du cache
+        price_book = PriceBook()
+        prefetch_batch_prices(wallets, price_book)
+        for wallet_address, result, error in fan_out(
+                lambda wallet: batch_result(wallet, price_book), wallets,
+                max_workers=BATCH_CONCURRENCY):
+            if error is not None:
+                line = {"wallet_address": wallet_address, "status": "error", "error": str(error)}
+            elif "error" in result:
+                line = {"wallet_address": wallet_address, "status": "error",
+                        "error": result["error"]}
+            else:
+                line = {"wallet_address": wallet_address, "status": "completed",
+                        "result": result_payload(result)}
+            yield json.dumps(line) + "\n"
     
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.call_on_close(batch_slots.release)
+    return response
+
+def result_payload(result):
+    """Résultat d'analyse tel que renvoyé par l'API"""
+    return {
+        "tokens": result["tokens"],
+        "total_value": result["total_value"],
+        "score": result["score"],
+        "token_count": result["score"].get("token_count", 0)
+    }
+
+def status_payload(analysis_id, analysis):
+    """Statut d'une analyse tel que renvoyé par /api/status et /api/stream"""
     if analysis["status"] == "completed":
-        result = analysis["result"]
-        return jsonify({
+        return {
             "status": "completed",
-            "result": {
-                "tokens": result["tokens"],
-                "total_value": result["total_value"],
-                "score": result["score"],
-                "token_count": result["score"].get("token_count", 0)
-            }
-        })
+            "result": result_payload(analysis["result"])
+        }
     elif analysis["status"] == "error":
-        return jsonify({
+        return {
             "status": "error",
             "error": analysis["error"]
-        })
+        }
+    elif analysis["status"] == "queued":
+        position = ANALYSIS_POOL.position(analysis_id)
+        if not position:
+            # Sortie de la file (ou worker libre), le worker n'a pas encore publié son état
+            return {"status": "running"}
+        return {
+            "status": "queued",
+            "queue_position": position,
+            "estimated_wait": ANALYSIS_POOL.estimated_wait(position)
+        }
     else:
-        return jsonify({
-            "status": "running"
-        })
+        payload = {"status": "running"}
+        if "progress" in analysis:
+            payload["progress"] = analysis["progress"]
+        if analysis.get("partial"):
+            # Résultat provisoire : chaînes déjà terminées seulement
+            payload["partial"] = True
+            payload["chains_done"] = analysis["chains_done"]
+            payload["chains_total"] = analysis["chains_total"]
+            if "result" in analysis:
+                payload["result"] = result_payload(analysis["result"])
+        return payload
+
+@bp.route('/api/status/<analysis_id>')
+def get_analysis_status(analysis_id):
+    """Obtenir le statut d'une analyse"""
+    analysis = active_analyses.get(analysis_id)
+    if analysis is None:
+        return jsonify({"error": "Analyse non trouvée"}), 404
+    
+    return jsonify(status_payload(analysis_id, analysis))
+
+@bp.route('/api/stream/<analysis_id>')
+def stream_analysis(analysis_id):
+    """Flux Server-Sent Events d'une analyse : le même contenu que
+    /api/status, poussé à chaque changement, jusqu'au résultat final"""
+    if analysis_id not in active_analyses:
+        return jsonify({"error": "Analyse non trouvée"}), 404
+    
+    def generate():
+        last_payload, last_sent = None, time.monotonic()
+        deadline = last_sent + SSE_MAX_DURATION
+        # Suivi libéré à la fermeture du flux (fin, client déconnecté)
+        with ANALYSIS_EVENTS.watch(analysis_id) as watch:
+            while time.monotonic() < deadline:
+                seen = watch.current()
+                analysis = active_analyses.get(analysis_id)   # lecture du store hors verrou
+                if analysis is None:
+                    yield f"data: {json.dumps({'status': 'error', 'error': 'Analyse non trouvée'})}\n\n"
+                    return
+                
+                payload = json.dumps(status_payload(analysis_id, analysis))
+                if payload != last_payload:
+                    yield f"data: {payload}\n\n"
+                    last_payload, last_sent = payload, time.monotonic()
+                    if analysis["status"] in ("completed", "error"):
+                        return
+                elif time.monotonic() - last_sent >= SSE_HEARTBEAT:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                
+                # Réveil à la prochaine mise à jour de cette analyse (ou
+                # relecture périodique si l'état est modifié hors de set_analysis,
+                # ex. par un autre worker avec JOB_STORE=sqlite)
+                watch.wait(seen, timeout=SSE_POLL_INTERVAL)
+    
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-@app.route('/api/chains')
+@bp.route('/api/chains')
 def get_chains():
     """API pour récupérer les chaînes supportées"""
     return jsonify(CHAIN_MAP)
 
-@app.route('/api/test-balances/<wallet_address>')
+@bp.route('/api/cache-stats')
+def get_cache_stats():
+    """Compteurs des caches partagés du processus"""
+    return jsonify({
+        "prices": PRICE_CACHE.stats(),
+        "balances": BALANCE_CACHE.stats(),
+        "results": RESULT_CACHE.stats(),
+        "analysis_pool": ANALYSIS_POOL.stats(),
+        "analyses": active_analyses.stats(),
+        "watched_analyses": ANALYSIS_EVENTS.watched(),
+        "single_flight": {"shared": UPSTREAM.shared, "in_flight": UPSTREAM.in_flight()}
+    })
+
+@bp.route('/api/test-balances/<wallet_address>')
 def test_balances(wallet_address):
     """API de test pour vérifier les balances d'un wallet"""
     try:
-        results = {}
-        for cid, chain_name in CHAIN_MAP.items():
-            try:
-                df = balances(wallet_address, cid)
-                results[chain_name] = {
+        by_cid = {}
+        for cid, df, error in fan_out(lambda c: balances(wallet_address, c), CHAIN_MAP):
+            if error is None:
+                by_cid[cid] = {
                     "positions_count": len(df),
                     "total_value": float(df.usd.sum()) if not df.empty else 0,
                     "positions": df.to_dict('records') if not df.empty else []
                 }
-            except Exception as e:
-                results[chain_name] = {
-                    "error": str(e),
+            else:
+                by_cid[cid] = {
+                    "error": str(error),
                     "positions_count": 0,
                     "total_value": 0,
                     "positions": []
                 }
+        results = {chain_name: by_cid[cid] for cid, chain_name in CHAIN_MAP.items()}
         
         return jsonify({
             "wallet": wallet_address,
@@ -686,6 +1268,34 @@ def test_balances(wallet_address):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def create_app():
+    """Crée l'application Flask : routes du blueprint + CORS
+    
+    Les bibliothèques lourdes ne sont pas chargées ici mais à la première
+    analyse ; un worker démarre et sert / et /api/chains sans elles.
+    """
+    flask_app = Flask(__name__)
+    CORS(flask_app)
+    flask_app.register_blueprint(bp)
+    return flask_app
+
+# Application par défaut (python app.py, run.py, gunicorn app:app)
+app = create_app()
+
+def warm_up():
+    """Préchargement avant le fork des workers (mode production)
+    
+    Importe les bibliothèques lourdes et met en cache le prix des tokens
+    natifs : les workers en héritent (pages mémoire partagées) au lieu de
+    les charger chacun à leur première analyse.
+    """
+    import numpy, pandas, web3          # noqa: F401
+    if SCAN_ENGINE == "async":
+        import async_engine             # noqa: F401
+    for cid, _, error in fan_out(lambda c: resolve_prices(c, [NATIVE_TOKEN]), CHAIN_TO_LLAMA):
+        if error is not None:
+            print(f"⚠️  Préchargement du prix natif ({CHAIN_MAP.get(cid, cid)}): {error}")
+
 def find_free_port(start_port=8080, max_attempts=10):
     """Trouve un port libre à partir du port de départ"""
     import socket
@@ -710,6 +1320,10 @@ if __name__ == '__main__':
         print("❌ Impossible de trouver un port libre")
         sys.exit(1)
     
+    # Ouvrir les connexions keep-alive vers les APIs amont avant la 1re analyse
+    if os.getenv("HTTP_PREWARM", "1") == "1":
+        http_client.prewarm(PREWARM_URLS)
+    
     print(f"🌐 Démarrage sur le port {port}")
     print(f"📍 URL: http://localhost:{port}")
     
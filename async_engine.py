@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Moteur de scan asyncio (alternative aux threads, SCAN_ENGINE=async)
+• Une boucle d'événements partagée dans un thread dédié
+• Connexions HTTP aiohttp poolées, requêtes identiques en vol partagées
+• Chaînes et requêtes d'une chaîne lancées en concurrence
+Même sortie que scan_chain_via_etherscan / analyze_wallet.
+"""
+
+import asyncio
+import atexit
+import threading
+import aiohttp
+from llama_prices import (LLAMA_PRICES, NATIVE_TOKEN, cached_prices, merge_fetched,
+                          parse_chunk, chunks)
+from rate_limit import throttle_async
+from http_client import MAX_RETRIES, RETRY_STATUS, backoff_delay, retry_after_delay
+from fanout import run_in_background
+from balance_snapshots import PINNED_BLOCKS, BALANCE_CACHE, balances_at_block
+import wallet_store
+import chain_scan
+from chain_scan import TOKEN_PAGE_SIZE
+
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=15)
+MAX_CONNECTIONS = 100
+
+class AsyncEngine:
+    """Boucle asyncio de fond + session aiohttp partagée"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._inflight = {}      # clé → Future partagée (dans la boucle)
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever,
+                                 name="async-engine", daemon=True).start()
+            return self._loop
+
+    def submit(self, coro):
+        """Planifie une coroutine sur la boucle partagée (concurrent.futures.Future)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Exécute une coroutine et attend son résultat (depuis un thread quelconque)"""
+        return self.submit(coro).result(timeout)
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=HTTP_TIMEOUT,
+                connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ttl_dns_cache=300))
+        return self._session
+
+    def close(self):
+        """Ferme la session HTTP partagée (appelé à la sortie du processus)"""
+        if self._loop is not None and self._session is not None and not self._session.closed:
+            try:
+                self.run(self._session.close(), timeout=2)
+            except Exception:
+                pass
+
+    async def shared(self, key, factory):
+        """Single-flight asyncio : un seul appel factory() par clé en vol"""
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()       # évite l'avertissement si personne n'attend
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def get_json(self, url, params=None, api_key=None, retries=MAX_RETRIES):
+        """GET JSON limité, avec la même politique de retry que http_client"""
+        for attempt in range(retries + 1):
+            await throttle_async(url, api_key)
+            delay = None
+            try:
+                async with self.session().get(url, params=params) as r:
+                    if r.status == 200:
+                        return await r.json(content_type=None)
+                    error = aiohttp.ClientResponseError(r.request_info, r.history,
+                                                        status=r.status, message=r.reason)
+                    if r.status not in RETRY_STATUS:
+                        raise error
+                    delay = retry_after_delay(r.headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            if attempt == retries:
+                raise error
+            await asyncio.sleep(backoff_delay(attempt) if delay is None else delay)
+
+    async def rpc(self, rpc_url, method, params):
+        payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+        await throttle_async(rpc_url)
+        async with self.session().post(rpc_url, json=payload) as r:
+            data = await r.json(content_type=None)
+        if "error" in data:
+            raise ValueError(data["error"])
+        return data["result"]
+
+    async def rpc_batch(self, rpc_url, calls):
+        """(méthode, params) en une requête JSON-RPC batch ; résultats dans l'ordre"""
+        await throttle_async(rpc_url)
+        async with self.session().post(rpc_url, json=chain_scan.rpc_batch_payload(calls)) as r:
+            replies = await r.json(content_type=None)
+        return chain_scan.rpc_batch_results(replies, len(calls))
+
+# Moteur partagé par tout le processus
+ENGINE = AsyncEngine()
+atexit.register(ENGINE.close)
+
+async def pinned_block(chain_id, rpc_url):
+    """Bloc de référence de la chaîne (même cache que balance_snapshots)"""
+    block = PINNED_BLOCKS.get(chain_id)
+    if block is None:
+        block = int(await ENGINE.shared(("block_number", chain_id),
+                                        lambda: ENGINE.rpc(rpc_url, "eth_blockNumber", [])), 16)
+        PINNED_BLOCKS.set(chain_id, block)
+    return block
+
+async def native_balance(rpc_url, wallet_addr, chain_id):
+    """(balance natif, bloc) via eth_getBalance au bloc épinglé (cache par bloc)
+
+    Repli sur latest (bloc None) si le bloc épinglé n'est pas lisible,
+    (0, None) si le RPC est indisponible.
+    """
+    if not rpc_url:
+        return 0, None
+    try:
+        block = await pinned_block(chain_id, rpc_url)
+        key = (wallet_addr.lower(), chain_id, NATIVE_TOKEN, block)
+        balance = BALANCE_CACHE.get(key)
+        if balance is None:
+            balance = int(await ENGINE.shared(("native",) + key, lambda: ENGINE.rpc(
+                rpc_url, "eth_getBalance", [wallet_addr, hex(block)])), 16)
+            BALANCE_CACHE.set(key, balance)
+        return balance, block
+    except Exception:
+        pass
+    try:
+        return int(await ENGINE.rpc(rpc_url, "eth_getBalance", [wallet_addr, "latest"]), 16), None
+    except Exception as e:
+        print(f"  ❌ Erreur balance natif: {e}")
+        return 0, None
+
+async def token_page(api_config, wallet_addr, page=1):
+    """Une page addresstokenbalance (requêtes identiques en vol partagées)"""
+    params = chain_scan.token_page_params(api_config, wallet_addr, page)
+    key = ("etherscan_tokens", api_config["chain_id"], wallet_addr.lower(), page)
+    return await ENGINE.shared(key, lambda: ENGINE.get_json(api_config["url"], params,
+                                                             api_config["key"]))
+
+async def page_quantities(chain_id, rpc_url, wallet_addr, holdings):
+    """(holdings, bloc) d'une page relue au bloc épinglé (TokenQuantity
+    conservées et bloc None sans RPC ou en cas d'erreur)"""
+    if not rpc_url:
+        return holdings, None
+    try:
+        _, current, block = await asyncio.to_thread(balances_at_block, chain_id, rpc_url,
+                                                    wallet_addr, list(holdings), False)
+    except Exception as e:
+        print(f"  ⚠️  Quantités non épinglées ({e}), TokenQuantity Etherscan conservées")
+        return holdings, None
+    return chain_scan.pinned_holdings(holdings, current), block
+
+async def token_pages(chain_name, api_config, wallet_addr, max_pages):
+    """Génère les pages (tokens, ok) ; la suivante est téléchargée pendant le traitement"""
+    page = 1
+    pending = asyncio.ensure_future(token_page(api_config, wallet_addr, page))
+    while pending is not None:
+        tokens, ok = [], False
+        try:
+            listing = await pending
+            tokens, ok = chain_scan.parse_token_page(listing)
+            if not ok:
+                print(f"  ⚠️  Erreur {chain_name}: {listing.get('message', 'Erreur inconnue')}")
+        except Exception as e:
+            print(f"  ❌ Erreur {chain_name}: {e}")
+        pending = None
+        if len(tokens) >= TOKEN_PAGE_SIZE and page < max_pages:
+            page += 1
+            pending = asyncio.ensure_future(token_page(api_config, wallet_addr, page))
+        yield tokens, ok
+
+async def _price_chunk(chunk):
+    try:
+        data = await ENGINE.get_json(LLAMA_PRICES.format(coins=",".join(chunk)))
+    except Exception as e:
+        print(f"  ⚠️  Erreur prix DefiLlama: {e}")
+        return {}
+    return parse_chunk(data, chunk)
+
+async def resolve_prices(chain_id, addrs, book=None):
+    """Équivalent asyncio de llama_prices.resolve_prices (même cache, même PriceBook)"""
+    fixed = {}
+    if book is not None:
+        fixed, addrs = book.split(chain_id, addrs)
+        if not addrs:
+            return fixed
+    prices, missing = cached_prices(chain_id, addrs)
+    if missing:
+        found = {}
+        for part in await asyncio.gather(*(ENGINE.shared(("llama", c),
+                                                         lambda c=c: _price_chunk(c))
+                                           for c in chunks(missing))):
+            found.update(part)
+        prices = merge_fetched(chain_id, prices, missing, found)
+    if book is not None:
+        book.add(chain_id, prices)
+    return dict(fixed, **prices)
+
+async def discover_tokens(chain_name, api_config, wallet_addr, max_pages=20, rpc_url=None):
+    """Découverte complète enregistrée dans l'index local (terminée si aucune
+    erreur), tokens datés du bloc épinglé de la chaîne"""
+    block = None
+    try:
+        if rpc_url:
+            block = await pinned_block(api_config["chain_id"], rpc_url)
+    except Exception:
+        pass
+    found = {}
+    for page in range(1, max_pages + 1):
+        tokens, ok = chain_scan.parse_token_page(await token_page(api_config, wallet_addr, page))
+        if not ok:
+            return          # message d'erreur (clé, quota...)
+        found.update(wallet_store.index_entries(tokens, block))
+        if len(tokens) < TOKEN_PAGE_SIZE:
+            break
+    await asyncio.to_thread(wallet_store.record_tokens, wallet_addr, api_config["chain_id"],
+                            found, True)
+    print(f"  📇 Index {chain_name}: {len(found)} tokens connus")
+
+async def scan_chain_via_index(chain_name, api_config, wallet_addr, rpc_url, priced_chains,
+                               known, price_book=None):
+    """(positions, bloc) à partir des tokens de l'index (Multicall3) ; None si
+    RPC indisponible"""
+    chain_id = api_config["chain_id"]
+    if not rpc_url:
+        return None
+    try:
+        native, current, block = await asyncio.to_thread(balances_at_block, chain_id, rpc_url,
+                                                         wallet_addr, list(known))
+    except Exception as e:
+        print(f"  ❌ Erreur Multicall {chain_name}: {e}")
+        return None
+    print(f"  📇 {len(known)} tokens connus via l'index ({chain_name})")
+
+    holdings = {addr: (known[addr]["symbol"], known[addr]["decimals"], quantity)
+                for addr, quantity in current.items()}
+    addrs = chain_scan.priced_addrs(native, holdings)
+    prices = (await resolve_prices(chain_id, addrs, price_book)
+              if addrs and chain_id in priced_chains else {})
+    return chain_scan.build_positions(chain_name, chain_id, native, holdings, prices), block
+
+async def scan_chain(chain_name, api_config, wallet_addr, rpc_url, priced_chains,
+                     max_pages=20, price_book=None):
+    """Scan asyncio d'une chaîne : natif en parallèle des pages, prix groupés par page
+
+    Tokens déjà connus de l'index local : Multicall3 direct, découverte
+    rafraîchie en tâche de fond si elle a vieilli. Renvoie (positions, bloc
+    commun à toutes les lectures), bloc None si le scan est incomplet.
+    """
+    chain_id = api_config["chain_id"]
+    known, refreshed_at = await asyncio.to_thread(wallet_store.load_tokens, wallet_addr, chain_id)
+    if known or refreshed_at is not None:
+        if wallet_store.discovery_stale(refreshed_at):
+            run_in_background(("discovery", chain_id, wallet_addr.lower()),
+                              lambda: ENGINE.run(discover_tokens(chain_name, api_config,
+                                                                 wallet_addr, max_pages,
+                                                                 rpc_url)))
+        indexed = await scan_chain_via_index(chain_name, api_config, wallet_addr, rpc_url,
+                                             priced_chains, known, price_book)
+        if indexed is not None:
+            return indexed
+
+    native_task = asyncio.ensure_future(native_balance(rpc_url, wallet_addr, chain_id))
+
+    results = []
+    blocks = set()      # blocs des lectures ; None = échec ou lecture hors bloc épinglé
+    page_no = 0
+    async for tokens, ok in token_pages(chain_name, api_config, wallet_addr, max_pages):
+        page_no += 1
+        if not ok:
+            blocks.add(None)
+        native = 0
+        if page_no == 1:
+            native, block = await native_task
+            blocks.add(block)
+
+        holdings = chain_scan.page_holdings(tokens)
+        if holdings:
+            holdings, block = await page_quantities(chain_id, rpc_url, wallet_addr, holdings)
+            blocks.add(block)
+        if tokens:
+            print(f"  📊 {len(tokens)} tokens trouvés via {chain_name} (page {page_no})")
+            await asyncio.to_thread(wallet_store.record_tokens, wallet_addr, chain_id,
+                                    wallet_store.index_entries(tokens, block))
+        addrs = chain_scan.priced_addrs(native, holdings)
+        prices = (await resolve_prices(chain_id, addrs, price_book)
+                  if addrs and chain_id in priced_chains else {})
+        results.extend(chain_scan.build_positions(chain_name, chain_id, native, holdings, prices))
+    return results, blocks.pop() if len(blocks) == 1 else None
+
+async def chain_fingerprint(api_config, wallet_addr, rpc_url, block=None):
+    """((nonce, dernier bloc de transfert ERC20, balance natif), bloc) lue au
+    bloc donné (bloc épinglé par défaut) ; empreinte None si indisponible"""
+    if not rpc_url or not api_config["key"]:
+        return None, block
+    try:
+        if block is None:
+            block = await pinned_block(api_config["chain_id"], rpc_url)
+        # Nonce et balance natif en un seul aller-retour (batch JSON-RPC)
+        (nonce, native), listing = await asyncio.gather(
+            ENGINE.rpc_batch(rpc_url, chain_scan.fingerprint_rpc_calls(wallet_addr, block)),
+            ENGINE.get_json(api_config["url"],
+                            chain_scan.last_transfer_params(api_config, wallet_addr, block),
+                            api_config["key"]))
+        return chain_scan.parse_fingerprint(nonce, native, listing), block
+    except Exception:
+        return None, block
+
+async def chain_positions(chain_name, api_config, wallet_addr, rpc_url, priced_chains,
+                          max_pages=20, price_book=None):
+    """Positions d'une chaîne ; instantané réutilisé si l'empreinte n'a pas changé
+
+    Sans instantané récent, l'empreinte est relevée en parallèle du scan,
+    seulement pour enregistrer son instantané (scan complet uniquement,
+    empreinte relevée au bloc du scan).
+    """
+    chain_id = api_config["chain_id"]
+    snapshot = await asyncio.to_thread(wallet_store.load_snapshot, wallet_addr, chain_id)
+    priced = chain_id in priced_chains
+    if wallet_store.snapshot_fresh(snapshot):
+        fingerprint, at_block = await chain_fingerprint(api_config, wallet_addr, rpc_url)
+        if wallet_store.snapshot_matches(snapshot, fingerprint):
+            positions = snapshot[1]
+            print(f"  ♻️  {chain_name} inchangée : {len(positions)} positions réutilisées")
+            addrs = [p["addr"] for p in positions]
+            prices = await resolve_prices(chain_id, addrs, price_book) if addrs and priced else {}
+            return wallet_store.reprice_positions(positions, prices)
+        results, block = await scan_chain(chain_name, api_config, wallet_addr, rpc_url,
+                                          priced_chains, max_pages, price_book)
+    else:
+        (fingerprint, at_block), (results, block) = await asyncio.gather(
+            chain_fingerprint(api_config, wallet_addr, rpc_url),
+            scan_chain(chain_name, api_config, wallet_addr, rpc_url, priced_chains, max_pages,
+                       price_book))
+    if block is not None and fingerprint is not None and at_block != block:
+        # Bloc épinglé renouvelé pendant le scan : empreinte relue au bloc du scan
+        fingerprint, _ = await chain_fingerprint(api_config, wallet_addr, rpc_url, block)
+    if fingerprint is not None and block is not None:
+        addrs = [r["addr"] for r in results]
+        prices = await resolve_prices(chain_id, addrs, price_book) if addrs and priced else {}
+        await asyncio.to_thread(wallet_store.save_snapshot, wallet_addr, chain_id, fingerprint,
+                                [dict(r, price=prices.get(r["addr"], 0)) for r in results])
+    return results
+
+async def scan_wallet(wallet_addr, etherscan_apis, rpc_endpoints, priced_chains,
+                      max_pages=20, on_chain=None, price_book=None):
+    """Scan de toutes les chaînes en concurrence ; échecs isolés par chaîne
+
+    on_chain(nom, positions) est appelé dans un thread (hors boucle) dès
+    qu'une chaîne est terminée (positions None en cas d'échec). price_book
+    (PriceBook) : prix fixés pour une analyse par lot.
+    """
+    names = list(etherscan_apis)
+
+    async def scan(name):
+        try:
+            results = await chain_positions(name, etherscan_apis[name], wallet_addr,
+                                            rpc_endpoints.get(etherscan_apis[name]["chain_id"]),
+                                            priced_chains, max_pages, price_book)
+        except Exception as e:
+            print(f"❌ Erreur pour {name}: {e}")
+            results = None
+        if on_chain:
+            # Hors boucle : le rappel (score, écriture du store) ne bloque pas les autres scans
+            await asyncio.to_thread(on_chain, name, results)
+        return results
+
+    outcomes = await asyncio.gather(*(scan(name) for name in names))
+    return [t for results in outcomes if results for t in results]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Balances lus à un bloc épinglé par chaîne, mis en cache par
+(wallet, chaîne, token, bloc)
+• Le bloc de référence d'une chaîne est partagé pendant BLOCK_PIN_TTL
+  secondes : les analyses répétées ou concurrentes dans cette fenêtre
+  lisent le même instantané et sont servies par le cache
+• Tous les tokens d'une analyse sont lus au même bloc (vue cohérente)
+"""
+
+import os
+from ttl_cache import TTLCache
+from singleflight import UPSTREAM
+from multicall import NATIVE_TOKEN, wallet_balances
+from providers import REGISTRY
+
+# Durée (s) pendant laquelle un bloc de référence est réutilisé
+BLOCK_PIN_TTL = float(os.getenv("BLOCK_PIN_TTL", "12"))
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "300"))
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "50000"))
+
+PINNED_BLOCKS = TTLCache(BLOCK_PIN_TTL, 1000)                      # chain_id → bloc
+BALANCE_CACHE = TTLCache(BALANCE_CACHE_TTL, BALANCE_CACHE_SIZE)   # (wallet, chain_id, token, bloc) → balance
+
+def pinned_block(chain_id, rpc_urls):
+    """Bloc de référence de la chaîne (relu au plus tous les BLOCK_PIN_TTL s)"""
+    block = PINNED_BLOCKS.get(chain_id)
+    if block is None:
+        block = UPSTREAM.do(("block_number", chain_id), REGISTRY.call, rpc_urls,
+                            lambda w3: w3.eth.block_number)
+        PINNED_BLOCKS.set(chain_id, block)
+    return block
+
+def balances_at_block(chain_id, rpc_urls, wallet_addr, tokens, include_native=True):
+    """(solde natif, {token: balance}, bloc) lus au bloc épinglé de la chaîne
+
+    Seuls les couples absents du cache sont lus, en Multicall3 (requêtes
+    identiques en vol partagées). Si le bloc épinglé n'est pas lisible
+    (endpoint en retard), repli sur "latest" sans mise en cache (bloc None).
+    Lève l'erreur RPC si aucun endpoint ne répond, y compris au repli :
+    jamais de balances à 0 faute de réponse.
+    """
+    wallet = wallet_addr.lower()
+    tokens = list(dict.fromkeys(t.lower() for t in tokens))
+    wanted = ([NATIVE_TOKEN] if include_native else []) + tokens
+    block = pinned_block(chain_id, rpc_urls)
+
+    found, missing = {}, []
+    for token in wanted:
+        cached = BALANCE_CACHE.get((wallet, chain_id, token, block))
+        if cached is None:
+            missing.append(token)
+        else:
+            found[token] = cached
+
+    if missing:
+        fetch_native = NATIVE_TOKEN in missing
+        missing_tokens = tuple(t for t in missing if t != NATIVE_TOKEN)
+        try:
+            native, fetched = UPSTREAM.do(
+                ("balances", chain_id, wallet, block, fetch_native, missing_tokens),
+                REGISTRY.call, rpc_urls, lambda w3: wallet_balances(
+                    w3, wallet, missing_tokens, fetch_native, block_identifier=block, strict=True))
+        except Exception as e:
+            print(f"  ⚠️  Bloc {block} illisible sur la chaîne {chain_id} ({e}), lecture à latest")
+            # strict : une erreur RPC remonte à l'appelant au lieu de balances à 0
+            native, fetched = REGISTRY.call(rpc_urls, lambda w3: wallet_balances(
+                w3, wallet, tokens, include_native, strict=True))
+            return native, fetched, None
+        if fetch_native:
+            fetched = dict(fetched, **{NATIVE_TOKEN: native})
+        for token, balance in fetched.items():
+            BALANCE_CACHE.set((wallet, chain_id, token, block), balance)
+        found.update(fetched)
+
+    native = found.get(NATIVE_TOKEN, 0) if include_native else 0
+    return native, {t: found.get(t, 0) for t in tokens}, block
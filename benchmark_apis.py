@@ -4,7 +4,7 @@ Benchmark des APIs pour détecter les tokens d'un wallet
 Teste toutes les APIs disponibles et compare leurs performances
 """
 
-import requests
+import http_client
 import time
 import json
 from typing import Dict, List, Tuple
@@ -13,6 +13,14 @@ from typing import Dict, List, Tuple
 WALLET_ADDRESS = "0x1c633eb00291398589718daa3938a6bd4f71949c"
 TIMEOUT = 10
 
+# Mesures de latence brute : ni limiteur de débit ni retries (leurs attentes
+# fausseraient les temps), session keep-alive partagée de http_client
+def get(url, **kwargs):
+    return http_client.get(url, retries=0, throttled=False, **kwargs)
+
+def post(url, **kwargs):
+    return http_client.post(url, retries=0, throttled=False, **kwargs)
+
 def test_etherscan_api() -> Dict:
     """Test de l'API Etherscan (gratuit, 5 req/sec)"""
     print("🔍 Test Etherscan API...")
@@ -33,7 +41,7 @@ def test_etherscan_api() -> Dict:
             "apikey": "YourApiKeyToken"  # Clé gratuite
         }
         
-        response = requests.get(url, params=params, timeout=TIMEOUT)
+        response = get(url, params=params, timeout=TIMEOUT)
         results["time"] = time.time() - start_time
         
         if response.ok:
@@ -82,7 +90,7 @@ def test_debank_api() -> Dict:
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         }
         
-        response = requests.get(url, headers=headers, timeout=TIMEOUT)
+        response = get(url, headers=headers, timeout=TIMEOUT)
         results["time"] = time.time() - start_time
         
         if response.ok:
@@ -94,7 +102,7 @@ def test_debank_api() -> Dict:
                 
                 # Obtenir les détails des chaînes
                 chains_url = f"https://api.debank.com/user/chain_list?id={WALLET_ADDRESS}&is_all=true"
-                chains_response = requests.get(chains_url, headers=headers, timeout=TIMEOUT)
+                chains_response = get(chains_url, headers=headers, timeout=TIMEOUT)
                 
                 if chains_response.ok:
                     chains_data = chains_response.json()
@@ -102,7 +110,7 @@ def test_debank_api() -> Dict:
                         if chain.get("usd_value", 0) > 0:
                             chain_id = chain.get("id")
                             tokens_url = f"https://api.debank.com/user/token_list?id={WALLET_ADDRESS}&chain_id={chain_id}&is_all=true"
-                            tokens_response = requests.get(tokens_url, headers=headers, timeout=TIMEOUT)
+                            tokens_response = get(tokens_url, headers=headers, timeout=TIMEOUT)
                             
                             if tokens_response.ok:
                                 tokens_data = tokens_response.json()
@@ -143,7 +151,7 @@ def test_moralis_api() -> Dict:
         }
         params = {"chain": "eth"}
         
-        response = requests.get(url, headers=headers, params=params, timeout=TIMEOUT)
+        response = get(url, headers=headers, params=params, timeout=TIMEOUT)
         results["time"] = time.time() - start_time
         
         if response.ok:
@@ -188,7 +196,7 @@ def test_covalent_api() -> Dict:
         params = {"nft": "false", "key": cov_key}
         headers = {"Accept": "application/json"}
         
-        response = requests.get(url, params=params, headers=headers, timeout=TIMEOUT)
+        response = get(url, params=params, headers=headers, timeout=TIMEOUT)
         results["time"] = time.time() - start_time
         
         if response.ok:
@@ -229,7 +237,7 @@ def test_defillama_api() -> Dict:
             try:
                 # Obtenir la liste des tokens populaires
                 tokens_url = f"{endpoint}/chains/ethereum"
-                response = requests.get(tokens_url, timeout=TIMEOUT)
+                response = get(tokens_url, timeout=TIMEOUT)
                 
                 if response.ok:
                     data = response.json()
@@ -352,7 +360,7 @@ def test_ankr_api() -> Dict:
             "id": 1
         }
         
-        response = requests.post(url, json=payload, timeout=TIMEOUT)
+        response = post(url, json=payload, timeout=TIMEOUT)
         results["time"] = time.time() - start_time
         
         if response.ok:
@@ -7,10 +7,12 @@ beta_portfolio_defillama.py – top 5 positions ≥ 10 USD, multichain
 • Historique 30 j : batch Covalent ; fallback CoinGecko pour Base
 """
 
-import os, sys, time, datetime as dt, requests
+import os, sys, time, datetime as dt
 import pandas as pd, numpy as np
 from dotenv import load_dotenv
 from tqdm import tqdm
+from llama_prices import resolve_prices
+import http_client
 
 # ───────── paramètres ─────────
 DAYS        = 30
@@ -43,14 +45,14 @@ HEAD = {"User-Agent": "beta-portfolio/1.0"}   # pas de clé dans HEAD
 
 # ───────── helpers ─────────
 def price_llama(chain_id: int, addr: str) -> float:
-    plat = CHAIN_TO_LLAMA.get(chain_id)
-    if not plat: return 0
-    url  = f"https://coins.llama.fi/prices/current/{plat}:{addr}"
-    r = requests.get(url, timeout=10)
-    return r.json()["coins"].get(f"{plat}:{addr}", {}).get("price", 0) if r.ok else 0
+    return prices_llama(chain_id, [addr]).get(addr.lower(), 0)
+
+def prices_llama(chain_id: int, addrs: list[str]) -> dict:   # cache partagé
+    if chain_id not in CHAIN_TO_LLAMA: return {a.lower(): 0 for a in addrs}
+    return resolve_prices(chain_id, addrs)
 
 def cgk_hist(id_, days):
-    r = requests.get(CGK_HIST.format(id=id_),
+    r = http_client.get(CGK_HIST.format(id=id_),
                      params={"vs_currency":"usd","days":days}, timeout=30)
     r.raise_for_status()
     d = pd.DataFrame(r.json()["prices"], columns=["ts","p"])
@@ -60,19 +62,22 @@ def cgk_hist(id_, days):
 # ───────── balances ─────────
 def balances(addr: str, cid: int) -> pd.DataFrame:
     url = COV_BAL.format(chain=cid, addr=addr)
-    r = requests.get(url, params={"nft":"false", "key": COV_KEY},
+    r = http_client.get(url, api_key=COV_KEY, params={"nft":"false", "key": COV_KEY},
                      headers=HEAD, timeout=30)
     if not r.ok:
         print(f"⚠️  {CHAIN_MAP[cid]} balances HTTP {r.status_code}")
         return pd.DataFrame()
 
+    items = r.json()["data"]["items"]
+    prices = prices_llama(cid, [it["contract_address"] for it in items
+                                if not it["quote"]])   # un seul lot DefiLlama
     rows=[]
-    for it in r.json()["data"]["items"]:
+    for it in items:
         usd = it["quote"] or 0
         if usd == 0:                                    # calcule via DefiLlama
             raw = int(it["balance"] or 0)
             dec = int(it.get("contract_decimals") or 18)
-            price = price_llama(cid, it["contract_address"].lower())
+            price = prices.get(it["contract_address"].lower(), 0)
             usd   = raw / 10**dec * price
         if usd >= MIN_USD:
             rows.append({
@@ -87,12 +92,12 @@ def balances(addr: str, cid: int) -> pd.DataFrame:
 def hist_prices(cid: int, addrs: list[str],
                 start: dt.date, end: dt.date) -> pd.DataFrame:
     url = COV_HIST.format(chain=cid, addr_csv=",".join(addrs))
-    r = requests.get(url, params={"from": start, "to": end, "key": COV_KEY},
+    r = http_client.get(url, api_key=COV_KEY, params={"from": start, "to": end, "key": COV_KEY},
                      headers=HEAD, timeout=60)
     if r.status_code == 404:
         frames=[]
         for a in addrs:
-            g=requests.get(
+            g=http_client.get(
                 f"https://api.coingecko.com/api/v3/coins/ethereum/contract/{a}/market_chart",
                 params={"vs_currency":"usd","days":DAYS}, timeout=30)
             if g.ok:
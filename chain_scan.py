@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Pièces communes aux deux moteurs de scan (threads et asyncio)
+• Paramètres et lecture des réponses Etherscan (pages de tokens, dernier transfert)
+• Requêtes JSON-RPC batch : construction et décodage
+• Lignes de positions (natif + tokens) à partir des balances et des prix
+Aucune entrée / sortie ici : chaque moteur fait ses appels et délègue le reste.
+"""
+
+from llama_prices import NATIVE_TOKEN
+
+# Plafond Etherscan par page addresstokenbalance
+TOKEN_PAGE_SIZE = 100
+
+def token_page_params(api_config, wallet_addr, page=1) -> dict:
+    """Paramètres d'une page addresstokenbalance"""
+    return {
+        "chainid": api_config["chain_id"],
+        "module": "account",
+        "action": "addresstokenbalance",
+        "address": wallet_addr,
+        "page": page,
+        "offset": TOKEN_PAGE_SIZE,
+        "apikey": api_config["key"]
+    }
+
+def parse_token_page(listing):
+    """(tokens, ok) d'une réponse addresstokenbalance
+
+    ok=False pour une erreur (clé, quota... : message dans result), True pour
+    une page lue ou la fin de la liste (aucun token).
+    """
+    if listing.get("status") == "1":
+        return listing.get("result") or [], True
+    return [], not listing.get("result")
+
+def page_holdings(tokens) -> dict:
+    """{adresse: (symbole, décimales, quantité)} d'une page ; lignes mal formées ignorées"""
+    holdings = {}
+    for token in tokens:
+        try:
+            holdings[token["TokenAddress"].lower()] = (
+                token.get("TokenSymbol", "UNKNOWN"),
+                int(token.get("TokenDivisor", "18")),
+                int(token.get("TokenQuantity", "0")))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            print(f"  ❌ Erreur token: {e}")
+    return holdings
+
+def pinned_holdings(holdings, quantities) -> dict:
+    """holdings d'une page avec les quantités relues au bloc épinglé
+    ({adresse: quantité}) à la place des TokenQuantity de l'indexeur"""
+    return {addr: (symbol, decimals, quantities.get(addr, 0))
+            for addr, (symbol, decimals, _) in holdings.items()}
+
+def last_transfer_params(api_config, wallet_addr, block) -> dict:
+    """Paramètres tokentx du dernier transfert ERC20 du wallet jusqu'au bloc"""
+    return {
+        "chainid": api_config["chain_id"],
+        "module": "account",
+        "action": "tokentx",
+        "address": wallet_addr,
+        "endblock": block,
+        "page": 1,
+        "offset": 1,
+        "sort": "desc",
+        "apikey": api_config["key"]
+    }
+
+def fingerprint_rpc_calls(wallet_addr, block) -> list:
+    """Appels JSON-RPC (nonce, balance natif) de l'empreinte, lus au bloc"""
+    return [("eth_getTransactionCount", [wallet_addr, hex(block)]),
+            ("eth_getBalance", [wallet_addr, hex(block)])]
+
+def parse_fingerprint(nonce, native, listing):
+    """(nonce, dernier bloc de transfert ERC20, balance natif) à partir des
+    réponses brutes (hex JSON-RPC, réponse tokentx) ; None si incomplète"""
+    if listing.get("status") == "1" and listing.get("result"):
+        last_transfer = int(listing["result"][0]["blockNumber"])
+    elif listing.get("message") == "No transactions found":
+        last_transfer = 0
+    else:
+        return None
+    return int(nonce, 16), last_transfer, int(native, 16)
+
+def rpc_batch_payload(calls) -> list:
+    """Corps d'une requête JSON-RPC batch pour des (méthode, params)"""
+    return [{"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)]
+
+def rpc_batch_results(replies, count) -> list:
+    """Résultats d'un batch dans l'ordre des appels ; ValueError si l'un échoue"""
+    if not isinstance(replies, list):
+        raise ValueError(replies)        # batch refusé par le nœud
+    by_id = {reply.get("id"): reply for reply in replies}
+    results = []
+    for i in range(count):
+        reply = by_id.get(i, {})
+        if "result" not in reply:
+            raise ValueError(reply.get("error"))
+        results.append(reply["result"])
+    return results
+
+def priced_addrs(native_balance, holdings) -> list:
+    """Adresses à valoriser : natif (si détenu) puis tokens de quantité > 0"""
+    addrs = [addr for addr, (_, _, quantity) in holdings.items() if quantity > 0]
+    if native_balance > 0:
+        addrs.insert(0, NATIVE_TOKEN)
+    return addrs
+
+def build_positions(chain_name, chain_id, native_balance, holdings, prices) -> list:
+    """Lignes de positions valorisées (natif puis tokens) ; les tokens sans
+    prix sont signalés et écartés
+
+    holdings : {adresse: (symbole, décimales, quantité)}, décimales None = 18
+    """
+    results = []
+    native_price = prices.get(NATIVE_TOKEN, 0)
+    if native_balance > 0 and native_price > 0:
+        native_value = native_balance / 10**18 * native_price
+        results.append({
+            "addr": NATIVE_TOKEN,
+            "sym": "ETH" if chain_name == "Ethereum" else f"Native-{chain_name}",
+            "usd": native_value,
+            "cid": chain_id,
+            "chain": chain_name
+        })
+        print(f"  ✅ Native: ${native_value:.2f}")
+
+    for token_addr, (symbol, decimals, quantity) in holdings.items():
+        if quantity <= 0:
+            continue
+        symbol = symbol or "UNKNOWN"
+        price = prices.get(token_addr, 0)
+        if price > 0:
+            # 0 décimale est valide : 18 seulement si inconnu
+            usd_value = quantity / 10**(18 if decimals is None else decimals) * price
+            results.append({
+                "addr": token_addr,
+                "sym": symbol,
+                "usd": usd_value,
+                "cid": chain_id,
+                "chain": chain_name
+            })
+            print(f"  ✅ {symbol}: ${usd_value:.2f}")
+        else:
+            print(f"  ❌ {symbol}: Prix non trouvé")
+    return results
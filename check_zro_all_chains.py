@@ -4,6 +4,7 @@ Vérifier ZRO sur toutes les chaînes
 """
 
 from web3 import Web3
+from providers import REGISTRY
 
 def check_zro_all_chains():
     """Vérifier ZRO sur toutes les chaînes"""
@@ -21,8 +22,6 @@ def check_zro_all_chains():
         "Avalanche": "https://avalanche.llamarpc.com"
     }
     
-    abi = [{"constant":True,"inputs":[{"name":"_owner","type":"address"}],"name":"balanceOf","outputs":[{"name":"balance","type":"uint256"}],"type":"function"}]
-    
     print(f"🔍 Vérification ZRO sur toutes les chaînes")
     print(f"👛 Wallet: {wallet}")
     print(f"🪙 Token ZRO: {zro_addr}")
@@ -30,28 +29,20 @@ def check_zro_all_chains():
     
     for chain_name, rpc_url in chains.items():
         try:
-            w3 = Web3(Web3.HTTPProvider(rpc_url))
-            if w3.is_connected():
-                try:
-                    contract = w3.eth.contract(
-                        address=Web3.to_checksum_address(zro_addr),
-                        abi=abi
-                    )
-                    balance = contract.functions.balanceOf(Web3.to_checksum_address(wallet)).call()
-                    
-                    if balance > 0:
-                        balance_human = balance / 10**18
-                        print(f"✅ {chain_name}: {balance_human:,.6f} ZRO")
-                    else:
-                        print(f"❌ {chain_name}: 0 ZRO")
-                        
-                except Exception as e:
-                    print(f"⚠️  {chain_name}: Erreur - {e}")
+            # Provider et contrat réutilisés, sans sonde is_connected()
+            contract = REGISTRY.contract(rpc_url, zro_addr)
+            balance = contract.functions.balanceOf(Web3.to_checksum_address(wallet)).call()
+            REGISTRY.mark_healthy(rpc_url)
+            
+            if balance > 0:
+                balance_human = balance / 10**18
+                print(f"✅ {chain_name}: {balance_human:,.6f} ZRO")
             else:
-                print(f"❌ {chain_name}: Impossible de se connecter")
+                print(f"❌ {chain_name}: 0 ZRO")
                 
         except Exception as e:
-            print(f"❌ {chain_name}: Erreur de connexion - {e}")
+            REGISTRY.mark_unhealthy(rpc_url)
+            print(f"⚠️  {chain_name}: Erreur - {e}")
 
 if __name__ == "__main__":
     check_zro_all_chains()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Exécution concurrente et bornée des scans par chaîne
+• Tâches de fond dédupliquées par clé, sur un pool fixe (ex. rafraîchissement
+  de découverte)
+• Pool fixe de workers avec file d'attente bornée (analyses /api/analyze)
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Nombre max de chaînes scannées en parallèle (CHAIN_CONCURRENCY)
+CHAIN_CONCURRENCY = int(os.getenv("CHAIN_CONCURRENCY", "6"))
+
+def fan_out(fn, items, max_workers=None):
+    """Exécute fn(item) pour chaque item, au plus max_workers à la fois
+
+    Génère (item, résultat, erreur) dans l'ordre d'achèvement : un échec
+    reste isolé à son item (erreur renseignée, résultat None). Les items
+    sont soumis au fil de l'eau (au plus max_workers en cours) : si le
+    générateur est fermé avant la fin (ex. client déconnecté), les items
+    restants ne sont jamais lancés et les appels en cours ne sont pas attendus.
+    """
+    items = list(items)
+    if not items:
+        return
+    workers = max(1, min(max_workers or CHAIN_CONCURRENCY, len(items)))
+    pending = iter(items)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chain")
+    try:
+        futures = {pool.submit(fn, item): item for item in items[:workers]}
+        for _ in range(workers):
+            next(pending)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = futures.pop(future)
+                following = next(pending, pending)
+                if following is not pending:
+                    futures[pool.submit(fn, following)] = following
+                try:
+                    outcome = (item, future.result(), None)
+                except Exception as e:
+                    outcome = (item, None, e)
+                yield outcome
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+# Tâches de fond (ex. rafraîchissement de découverte) : pool fixe de
+# BACKGROUND_WORKERS threads, les tâches en trop attendent leur tour
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+
+_background = {}                 # clé → Future, tâche en file ou en cours
+_background_lock = threading.Lock()
+_background_pool = None
+
+def _reset_background():
+    # Processus forké (workers gunicorn) : les threads du parent n'existent pas
+    global _background, _background_lock, _background_pool
+    _background, _background_lock, _background_pool = {}, threading.Lock(), None
+
+os.register_at_fork(after_in_child=_reset_background)
+
+def run_in_background(key, fn, *args, **kwargs):
+    """Met fn en file dans le pool de fond, sauf si une tâche de même clé
+    est déjà en file ou en cours (renvoie alors son Future)"""
+    global _background_pool
+
+    def run():
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"⚠️  Tâche de fond {key}: {e}")
+        finally:
+            with _background_lock:
+                _background.pop(key, None)
+
+    with _background_lock:
+        if key in _background:
+            return _background[key]
+        if _background_pool is None:
+            _background_pool = ThreadPoolExecutor(max_workers=max(1, BACKGROUND_WORKERS),
+                                                  thread_name_prefix="background")
+        future = _background[key] = _background_pool.submit(run)
+        return future
+
+def wait_background(timeout=None):
+    """Attend la fin des tâches de fond en file / en cours (ex. avant la sortie d'un script)"""
+    with _background_lock:
+        futures = list(_background.values())
+    if futures:
+        wait(futures, timeout)
+
+class QueueFull(Exception):
+    """File d'attente pleine ; retry_after = attente estimée (s) avant une place"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"File d'attente pleine, réessayer dans ~{retry_after}s")
+        self.retry_after = retry_after
+
+class JobPool:
+    """Pool de `workers` créneaux, au plus `max_queue` tâches en attente (FIFO)
+
+    Les threads (`threads`, un par créneau par défaut) sont démarrés au
+    premier submit. Une tâche qui renvoie une concurrent.futures.Future
+    (coroutine planifiée sur une boucle asyncio) libère son thread tout de
+    suite et garde son créneau jusqu'à la fin de la Future : avec threads=1,
+    le pool ne fait que l'admission. Une tâche n'attend que si tous les
+    créneaux sont occupés : sa position (1 = prochaine à démarrer quand un
+    créneau se libère, 0 = démarre tout de suite) ne compte pas les créneaux
+    libres. La durée moyenne des tâches (moyenne glissante,
+    `default_duration` avant la première) sert à estimer l'attente.
+    """
+
+    def __init__(self, workers, max_queue, default_duration=30.0, name="job", threads=None):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.threads = max(1, min(threads or self.workers, self.workers))
+        self.name = name
+        self.running = 0
+        self.rejected = 0
+        self._avg_duration = default_duration
+        self._queue = OrderedDict()          # id → fn, ordre d'arrivée
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _idle(self):
+        # Workers libres pas encore attribués (appelé sous self._cond)
+        return self.workers - self.running
+
+    def submit(self, job_id, fn):
+        """Met fn en file ; renvoie sa position (0 = démarre tout de suite),
+        QueueFull si workers et file sont pleins"""
+        with self._cond:
+            if self.running + len(self._queue) >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise QueueFull(self.estimated_wait(max(1, len(self._queue) + 1 - self._idle())))
+            self._queue[job_id] = fn
+            if not self._threads:
+                self._threads = [threading.Thread(target=self._work, name=f"{self.name}-{i}",
+                                                  daemon=True) for i in range(self.threads)]
+                for thread in self._threads:
+                    thread.start()
+            self._cond.notify()
+            return max(0, len(self._queue) - self._idle())
+
+    def position(self, job_id):
+        """Position dans la file (1 = prochaine, 0 = démarre tout de suite),
+        None si démarrée ou inconnue"""
+        with self._cond:
+            for position, queued_id in enumerate(self._queue, 1):
+                if queued_id == job_id:
+                    return max(0, position - self._idle())
+        return None
+
+    def estimated_wait(self, position):
+        """Attente estimée (s) avant le démarrage d'une tâche à cette position"""
+        if position <= 0:
+            return 0
+        return math.ceil(math.ceil(position / self.workers) * self._avg_duration)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "threads": self.threads,
+                "running": self.running,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "rejected": self.rejected,
+                "avg_duration": round(self._avg_duration, 2)
+            }
+
+    def _release(self, started):
+        with self._cond:
+            self.running -= 1
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
+            self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue and self._idle() > 0)
+                job_id, fn = self._queue.popitem(last=False)
+                self.running += 1
+            started = time.monotonic()
+            pending = None
+            try:
+                pending = fn()
+            except Exception as e:
+                print(f"⚠️  Tâche {job_id}: {e}")
+            if isinstance(pending, Future):
+                # Créneau rendu à la fin de la Future, pas du thread
+                pending.add_done_callback(lambda _, started=started: self._release(started))
+            else:
+                self._release(started)
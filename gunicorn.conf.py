@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Configuration gunicorn du mode production (./start.sh prod, python run.py --prod)
+• Workers pré-forkés (WEB_WORKERS) × threads par worker (WEB_THREADS) :
+  les flux SSE et les analyses en attente occupent un thread chacun
+• App préchargée avant le fork (WEB_PRELOAD) : config des chaînes, bibliothèques
+  lourdes et prix natifs (WEB_WARM_CACHES) partagés par les workers
+• Redémarrage gracieux : HUP recharge la config et remplace les workers ;
+  ./start.sh reload (USR2 puis TERM de l'ancien maître) recharge aussi le code
+• Plusieurs workers : état des analyses partagé via JOB_STORE=sqlite (défaut),
+  limites de débit amont réparties entre workers
+"""
+
+import multiprocessing
+import os
+
+bind = f"{os.getenv('WEB_HOST', '0.0.0.0')}:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_WORKERS", str(min(4, multiprocessing.cpu_count()))))
+threads = int(os.getenv("WEB_THREADS", "16"))
+worker_class = "gthread"
+
+preload_app = os.getenv("WEB_PRELOAD", "1") == "1"
+WARM_CACHES = os.getenv("WEB_WARM_CACHES", "1") == "1"
+
+# Délai (s) laissé aux requêtes en cours lors d'un arrêt / redémarrage gracieux
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recyclage des workers après N requêtes (0 = jamais), avec étalement
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+pidfile = os.getenv("WEB_PIDFILE", "gunicorn.pid")
+daemon = os.getenv("WEB_DAEMON", "0") == "1"
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+
+# Les workers ne partagent pas la mémoire : sans store commun, un /api/status
+# servi par un autre worker ne trouverait pas l'analyse (lu à l'import de app)
+if workers > 1:
+    os.environ.setdefault("JOB_STORE", "sqlite")
+
+def when_ready(server):
+    """Maître prêt, workers pas encore forkés : préchargement partagé"""
+    if preload_app and WARM_CACHES:
+        import app
+        app.warm_up()
+        server.log.info("Caches préchargés avant le fork des workers")
+
+def post_fork(server, worker):
+    """Dans chaque nouveau worker : connexions et limiteur propres au processus"""
+    import http_client
+    import rate_limit
+    http_client.reset_sessions()
+    rate_limit.share_between(server.cfg.workers)
+    if os.getenv("HTTP_PREWARM", "1") == "1":
+        import app
+        http_client.prewarm(app.PREWARM_URLS)
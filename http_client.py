@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Client HTTP central pour tous les appels sortants
+• Pool de Session keep-alive par hôte (+ pré-chauffage optionnel)
+• Limiteur token-bucket partagé (rate_limit)
+• Retries avec backoff exponentiel jitté, respect de Retry-After sur 429
+• Deadline par appel : budget total, retries compris
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from rate_limit import throttle
+
+HEAD = {"User-Agent": "beta-portfolio/1.0"}
+
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))   # secondes
+BACKOFF_CAP = float(os.getenv("HTTP_BACKOFF_CAP", "8"))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def session_for(url: str) -> requests.Session:
+    """Session keep-alive partagée pour l'hôte de cette URL"""
+    parsed = urlparse(url)
+    key = (parsed.scheme, parsed.netloc)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEAD)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount(f"{parsed.scheme}://", adapter)
+            _sessions[key] = session
+        return session
+
+def reset_sessions():
+    """Oublie les sessions héritées du processus parent (à appeler après un
+    fork) : leurs connexions keep-alive ne doivent pas être partagées"""
+    global _sessions_lock
+    _sessions_lock = threading.Lock()
+    _sessions.clear()
+
+def backoff_delay(attempt: int) -> float:
+    """Backoff exponentiel avec jitter : dans [d/2, d], d = base·2^attempt plafonné"""
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def retry_after_delay(headers) -> float:
+    """Délai demandé par un en-tête Retry-After (secondes ou date HTTP), None sinon"""
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def etherscan_rate_limited(response) -> bool:
+    """Etherscan signale le dépassement de quota par un 200 NOTOK"""
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    return (isinstance(data, dict) and data.get("status") == "0"
+            and "rate limit" in str(data.get("result", "")).lower())
+
+def request(method, url, params=None, headers=None, timeout=10, deadline=None,
+            retries=MAX_RETRIES, api_key=None, retry_on=None, throttled=True, **kwargs):
+    """Requête via la session de l'hôte, limitée, avec retries et deadline
+
+    timeout : délai max par tentative ; deadline : budget total (s) pour
+    toutes les tentatives. retry_on(response) permet de rejouer une réponse
+    applicative d'échec (ex. etherscan_rate_limited). throttled=False
+    contourne le limiteur (mesures de latence). Renvoie la dernière
+    réponse obtenue ; lève la dernière exception réseau si aucune.
+    """
+    session = session_for(url)
+    expires = time.monotonic() + deadline if deadline else None
+    attempt = 0
+    while True:
+        if throttled:
+            throttle(url, api_key)
+        attempt_timeout = timeout
+        if expires is not None:
+            attempt_timeout = min(timeout, max(0.1, expires - time.monotonic()))
+
+        error, response, delay = None, None, None
+        try:
+            response = session.request(method, url, params=params, headers=headers,
+                                       timeout=attempt_timeout, **kwargs)
+            if response.status_code in RETRY_STATUS:
+                delay = retry_after_delay(response.headers)
+            elif not (retry_on and retry_on(response)):
+                return response
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        if delay is None:
+            delay = backoff_delay(attempt)
+        if attempt >= retries or (expires is not None and time.monotonic() + delay >= expires):
+            if response is not None:
+                return response
+            raise error
+        if response is not None:
+            # Réponse abandonnée : libère sa connexion (stream=True) avant de rejouer
+            response.close()
+        time.sleep(delay)
+        attempt += 1
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def prewarm(urls, wait=False):
+    """Ouvre à l'avance une connexion keep-alive vers chaque hôte (TLS compris)"""
+    def warm(url):
+        try:
+            session_for(url).head(url, timeout=5, allow_redirects=False)
+        except requests.RequestException:
+            pass
+
+    pool = ThreadPoolExecutor(max_workers=max(1, len(urls)), thread_name_prefix="prewarm")
+    futures = [pool.submit(warm, url) for url in urls]
+    pool.shutdown(wait=wait)
+    return futures
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Résolution groupée des prix DefiLlama (plusieurs tokens par requête)
+• Cache process-wide (chain_id, token) avec TTL et LRU borné
+• Lots identiques en vol partagés (single-flight)
+"""
+
+import os
+import threading
+import http_client
+from singleflight import UPSTREAM
+from ttl_cache import TTLCache
+
+LLAMA_PRICES = "https://coins.llama.fi/prices/current/{coins}"
+NATIVE_TOKEN = "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee"
+
+CHAIN_TO_LLAMA = {                   # chainId → slug DefiLlama
+    1: "ethereum", 56: "bsc", 42161: "arbitrum", 10: "optimism",
+    43114: "avalanche", 8453: "base"
+}
+
+# Nombre de coins par requête (garde l'URL sous ~2 Ko)
+BATCH_SIZE = 40
+
+# Cache des prix : PRICE_CACHE_TTL secondes, PRICE_CACHE_SIZE entrées max
+PRICE_CACHE = TTLCache(ttl=float(os.getenv("PRICE_CACHE_TTL", "60")),
+                       maxsize=int(os.getenv("PRICE_CACHE_SIZE", "10000")))
+
+def parse_chunk(data, chunk) -> dict:
+    """Prix d'un lot à partir de la réponse DefiLlama (0 pour un coin sans prix)"""
+    found = {k.lower(): v.get("price", 0) for k, v in data.get("coins", {}).items()}
+    return {coin: found.get(coin, 0) for coin in chunk}
+
+def _fetch_chunk(chunk: tuple) -> dict:
+    """Un lot DefiLlama ; None si la requête échoue"""
+    try:
+        r = http_client.get(LLAMA_PRICES.format(coins=",".join(chunk)), timeout=10, deadline=20)
+        if not r.ok:
+            print(f"  ⚠️  DefiLlama HTTP {r.status_code}")
+            return None
+        return parse_chunk(r.json(), chunk)
+    except Exception as e:
+        print(f"  ⚠️  Erreur prix DefiLlama: {e}")
+        return None
+
+def fetch_llama_prices(coins: list[str]) -> dict:
+    """Récupère les prix d'une liste de clés chain:address, par lots
+
+    Les coins d'un lot répondu sans prix valent 0 ; ceux d'un lot en échec
+    sont absents du résultat (pour ne pas mettre l'échec en cache).
+    """
+    prices = {}
+    for chunk in chunks(coins):
+        prices.update(UPSTREAM.do(("llama", chunk), _fetch_chunk, chunk) or {})
+    return prices
+
+def chunks(coins: list[str]) -> list[tuple]:
+    """Lots de BATCH_SIZE coins (tuples, utilisables comme clés single-flight)"""
+    return [tuple(coins[i:i + BATCH_SIZE]) for i in range(0, len(coins), BATCH_SIZE)]
+
+def cached_prices(chain_id: int, addrs: list[str]):
+    """(prix en cache, coins chain:address manquants) pour des adresses ;
+    aucun coin manquant si la chaîne n'est pas couverte par DefiLlama"""
+    addrs = list(dict.fromkeys(a.lower() for a in addrs if a))
+    plat = CHAIN_TO_LLAMA.get(chain_id)
+    if not plat:
+        return {a: 0 for a in addrs}, []
+    prices, missing = {}, []
+    for a in addrs:
+        cached = PRICE_CACHE.get((chain_id, a))
+        if cached is None:
+            missing.append(f"{plat}:{a}")
+        else:
+            prices[a] = cached
+    return prices, missing
+
+def merge_fetched(chain_id: int, prices: dict, missing: list[str], found: dict) -> dict:
+    """Complète prices avec les coins récupérés (mis en cache), 0 pour les absents"""
+    for coin in missing:
+        addr = coin.split(":", 1)[1]
+        if coin in found:
+            PRICE_CACHE.set((chain_id, addr), found[coin])
+        prices[addr] = found.get(coin, 0)
+    return prices
+
+def resolve_prices(chain_id: int, addrs: list[str], book=None) -> dict:
+    """Prix USD par adresse (minuscule) pour une chaîne, 0 si inconnu
+
+    book (PriceBook) : prix déjà fixés pour le lot en cours, complétés avec
+    ceux résolus ici.
+    """
+    fixed = {}
+    if book is not None:
+        fixed, addrs = book.split(chain_id, addrs)
+        if not addrs:
+            return fixed
+    prices, missing = cached_prices(chain_id, addrs)
+    if missing:
+        prices = merge_fetched(chain_id, prices, missing, fetch_llama_prices(missing))
+    if book is not None:
+        book.add(chain_id, prices)
+    return dict(fixed, **prices)
+
+class PriceBook:
+    """Prix fixés pour la durée d'une analyse par lot
+
+    Un token valorisé une fois (préchargement ou premier wallet qui le
+    détient) garde ce prix pour tous les wallets du lot, même après
+    l'expiration de PRICE_CACHE. Les prix nuls (inconnus ou lot DefiLlama en
+    échec) ne sont pas fixés.
+    """
+
+    def __init__(self):
+        self._prices = {}                    # (chain_id, adresse) → prix
+        self._lock = threading.Lock()
+
+    def split(self, chain_id: int, addrs: list[str]):
+        """(prix fixés, adresses restant à résoudre)"""
+        fixed, missing = {}, []
+        with self._lock:
+            for a in dict.fromkeys(a.lower() for a in addrs if a):
+                price = self._prices.get((chain_id, a))
+                if price is None:
+                    missing.append(a)
+                else:
+                    fixed[a] = price
+        return fixed, missing
+
+    def add(self, chain_id: int, prices: dict):
+        with self._lock:
+            for a, price in prices.items():
+                if price > 0:
+                    self._prices.setdefault((chain_id, a), price)
+
+    def __len__(self):
+        return len(self._prices)
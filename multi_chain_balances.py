@@ -3,11 +3,13 @@
 Détection automatique des tokens sur toutes les chaînes EVM via APIs Etherscan
 """
 
-import requests
 import os
 from dotenv import load_dotenv
-from web3 import Web3
-import time
+from llama_prices import resolve_prices, NATIVE_TOKEN
+from balance_snapshots import balances_at_block
+from fanout import run_in_background, wait_background
+from tokentx import fold_history
+import wallet_store
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -52,50 +54,29 @@ RPC_ENDPOINTS = {
 
 def get_token_price(chain_id, token_addr):
     """Obtenir le prix d'un token via DefiLlama"""
+    return get_token_prices(chain_id, [token_addr]).get(token_addr.lower(), 0)
+
+def get_token_prices(chain_id, token_addrs):
+    """Obtenir les prix de plusieurs tokens via DefiLlama (requêtes groupées)"""
     try:
-        chain_slugs = {
-            1: "ethereum",
-            56: "bsc",
-            42161: "arbitrum",
-            10: "optimism",
-            43114: "avalanche"
-        }
-        
-        chain_slug = chain_slugs.get(chain_id)
-        if not chain_slug:
-            return 0
-            
-        url = f"https://coins.llama.fi/prices/current/{chain_slug}:{token_addr}"
-        response = requests.get(url, timeout=10)
-        
-        if response.ok:
-            data = response.json()
-            return data.get("coins", {}).get(f"{chain_slug}:{token_addr}", {}).get("price", 0)
+        return resolve_prices(chain_id, token_addrs)
     except:
-        pass
-    return 0
+        return {a.lower(): 0 for a in token_addrs}
 
-def get_balance_via_web3(chain_id, wallet_addr, token_addr, decimals):
-    """Obtenir le balance actuel via Web3"""
+def get_balances_via_multicall(chain_id, wallet_addr, token_addrs, include_native=True):
+    """Obtenir natif + balances de tous les tokens en quelques appels Multicall3
+    (lus au bloc épinglé de la chaîne, cache par bloc)"""
     try:
         rpc_url = RPC_ENDPOINTS.get(chain_id)
         if not rpc_url:
-            return 0
-            
-        w3 = Web3(Web3.HTTPProvider(rpc_url))
-        if not w3.is_connected():
-            return 0
-            
-        abi = [{"constant":True,"inputs":[{"name":"_owner","type":"address"}],"name":"balanceOf","outputs":[{"name":"balance","type":"uint256"}],"type":"function"}]
+            return 0, {}
         
-        contract = w3.eth.contract(
-            address=Web3.to_checksum_address(token_addr),
-            abi=abi
-        )
-        balance = contract.functions.balanceOf(Web3.to_checksum_address(wallet_addr)).call()
-        return balance
-    except:
-        return 0
+        native, token_balances, _ = balances_at_block(chain_id, rpc_url, wallet_addr,
+                                                      token_addrs, include_native)
+        return native, token_balances
+    except Exception as e:
+        print(f"  ❌ Erreur Multicall3: {e}")
+        return 0, {}
 
 def get_native_balance(chain_id, wallet_addr):
     """Obtenir le balance natif (ETH, BNB, etc.)"""
@@ -104,127 +85,106 @@ def get_native_balance(chain_id, wallet_addr):
         if not rpc_url:
             return 0
             
-        w3 = Web3(Web3.HTTPProvider(rpc_url))
-        if not w3.is_connected():
-            return 0
-            
-        balance = w3.eth.get_balance(Web3.to_checksum_address(wallet_addr))
-        return balance
+        return balances_at_block(chain_id, rpc_url, wallet_addr, [])[0]
     except:
         return 0
 
+def sync_token_balances(api_config, wallet_addr):
+    """Balances nets par token, mis à jour depuis le curseur du wallet
+    
+    Seuls les transferts postérieurs au dernier bloc traité sont demandés
+    (startblock=curseur+1) et repliés en streaming dans l'état persistant
+    (tokentx.fold_history). Renvoie None si l'API est en erreur (le curseur
+    n'est alors pas modifié).
+    """
+    chain_id = api_config["chain_id"]
+    last_block, token_balances = wallet_store.load_cursor(wallet_addr, chain_id)
+    try:
+        token_balances, new_transfers, synced_block = fold_history(
+            api_config, wallet_addr, startblock=last_block + 1, token_balances=token_balances)
+    except Exception as e:
+        print(f"  ❌ Erreur API: {e}")
+        return None
+    
+    if new_transfers:
+        last_block = synced_block
+        wallet_store.save_cursor(wallet_addr, chain_id, last_block, token_balances)
+    print(f"  🔄 {new_transfers} nouveaux transferts (curseur: bloc {last_block})")
+    return token_balances
+
+def discover_tokens(api_config, wallet_addr):
+    """Synchronise les transferts et enregistre les tokens touchés dans l'index"""
+    token_balances = sync_token_balances(api_config, wallet_addr)
+    if token_balances is None:
+        return
+    print(f"  📊 {len(token_balances)} tokens uniques trouvés")
+    wallet_store.record_tokens(wallet_addr, api_config["chain_id"], token_balances,
+                               complete=True)
+
 def scan_chain_tokens(chain_name, api_config, wallet_addr):
     """Scanner les tokens d'une chaîne via son API Etherscan"""
     print(f"🔍 Analyse de {chain_name}...")
     
     results = []
     
-    # 1. Vérifier le balance natif
-    try:
-        native_balance = get_native_balance(api_config["chain_id"], wallet_addr)
-        if native_balance > 0:
-            # Obtenir le prix du token natif
-            native_price = get_token_price(api_config["chain_id"], "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee")
-            if native_price > 0:
-                native_value = native_balance / 10**18 * native_price
-                if native_value >= 10:  # Seuil de 10$
-                    results.append({
-                        "chain": chain_name,
-                        "symbol": "ETH" if chain_name == "Ethereum" else f"Native-{chain_name}",
-                        "address": "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee",
-                        "balance": native_balance,
-                        "decimals": 18,
-                        "price": native_price,
-                        "usd_value": native_value
-                    })
-                    print(f"  ✅ Native: ${native_value:.2f}")
-    except Exception as e:
-        print(f"  ❌ Erreur balance natif: {e}")
-    
-    # 2. Scanner les tokens ERC20 via l'API
-    if api_config["key"]:
-        try:
-            params = {
-                "module": "account",
-                "action": "tokentx",
-                "address": wallet_addr,
-                "startblock": 0,
-                "endblock": 99999999,
-                "sort": "desc",
-                "apikey": api_config["key"]
-            }
-            
-            response = requests.get(api_config["url"], params=params, timeout=15)
-            
-            if response.ok:
-                data = response.json()
-                if data.get("status") == "1":
-                    transactions = data.get("result", [])
-                    
-                    # Grouper par token et calculer le balance net
-                    token_balances = {}
-                    for tx in transactions:
-                        token_addr = tx.get("contractAddress", "").lower()
-                        if token_addr and token_addr not in token_balances:
-                            token_balances[token_addr] = {
-                                "symbol": tx.get("tokenSymbol", "UNKNOWN"),
-                                "decimals": int(tx.get("tokenDecimal", 18)),
-                                "name": tx.get("tokenName", "Unknown Token"),
-                                "net_balance": 0
-                            }
-                        
-                        if token_addr:
-                            # Calculer le balance net (entrées - sorties)
-                            value = int(tx.get("value", "0"))
-                            if tx.get("to", "").lower() == wallet_addr.lower():
-                                # Réception
-                                token_balances[token_addr]["net_balance"] += value
-                            elif tx.get("from", "").lower() == wallet_addr.lower():
-                                # Envoi
-                                token_balances[token_addr]["net_balance"] -= value
-                    
-                    print(f"  📊 {len(token_balances)} tokens uniques trouvés")
-                    
-                    # Vérifier chaque token avec balance positif
-                    for token_addr, token_info in token_balances.items():
-                        if token_info["net_balance"] > 0:
-                            try:
-                                # Vérifier le balance actuel via Web3
-                                current_balance = get_balance_via_web3(
-                                    api_config["chain_id"], 
-                                    wallet_addr, 
-                                    token_addr, 
-                                    token_info["decimals"]
-                                )
-                                
-                                if current_balance > 0:
-                                    # Obtenir le prix
-                                    price = get_token_price(api_config["chain_id"], token_addr)
-                                    if price > 0:
-                                        usd_value = current_balance / 10**token_info["decimals"] * price
-                                        if usd_value >= 10:  # Seuil de 10$
-                                            results.append({
-                                                "chain": chain_name,
-                                                "symbol": token_info["symbol"],
-                                                "address": token_addr,
-                                                "balance": current_balance,
-                                                "decimals": token_info["decimals"],
-                                                "price": price,
-                                                "usd_value": usd_value
-                                            })
-                                            print(f"  ✅ {token_info['symbol']}: ${usd_value:.2f}")
-                                            
-                            except Exception as e:
-                                continue
-                else:
-                    print(f"  ⚠️  Erreur API: {data.get('message', 'Erreur inconnue')}")
-            else:
-                print(f"  ❌ Erreur HTTP: {response.status_code}")
-                
-        except Exception as e:
-            print(f"  ❌ Erreur API: {e}")
-    else:
+    # 1. Tokens connus de l'index local ; découverte (tokentx) synchrone la
+    #    première fois, puis rafraîchie en tâche de fond quand elle vieillit
+    chain_id = api_config["chain_id"]
+    candidates, refreshed_at = wallet_store.load_tokens(wallet_addr, chain_id)
+    if not api_config["key"]:
         print(f"  ⚠️  Pas de clé API pour {chain_name}")
+    elif not candidates and refreshed_at is None:
+        discover_tokens(api_config, wallet_addr)
+        candidates, _ = wallet_store.load_tokens(wallet_addr, chain_id)
+    else:
+        print(f"  📇 {len(candidates)} tokens connus (index local)")
+        if wallet_store.discovery_stale(refreshed_at):
+            run_in_background(("discovery", chain_id, wallet_addr.lower()),
+                              discover_tokens, api_config, wallet_addr)
+    
+    # 2. Vérifier natif + balances actuels en quelques appels Multicall3
+    native_balance, current = get_balances_via_multicall(
+        chain_id, wallet_addr, list(candidates))
+    holdings = [(token_addr, token_info, current[token_addr])
+                for token_addr, token_info in candidates.items()
+                if current.get(token_addr, 0) > 0]
+    
+    # 3. Résoudre les prix du natif et des tokens détenus en une passe groupée
+    addrs = [token_addr for token_addr, _, _ in holdings]
+    if native_balance > 0:
+        addrs.insert(0, NATIVE_TOKEN)
+    prices = get_token_prices(chain_id, addrs) if addrs else {}
+    
+    native_price = prices.get(NATIVE_TOKEN, 0)
+    if native_balance > 0 and native_price > 0:
+        native_value = native_balance / 10**18 * native_price
+        if native_value >= 10:  # Seuil de 10$
+            results.append({
+                "chain": chain_name,
+                "symbol": "ETH" if chain_name == "Ethereum" else f"Native-{chain_name}",
+                "address": NATIVE_TOKEN,
+                "balance": native_balance,
+                "decimals": 18,
+                "price": native_price,
+                "usd_value": native_value
+            })
+            print(f"  ✅ Native: ${native_value:.2f}")
+    
+    for token_addr, token_info, current_balance in holdings:
+        price = prices.get(token_addr, 0)
+        if price > 0:
+            usd_value = current_balance / 10**token_info["decimals"] * price
+            if usd_value >= 10:  # Seuil de 10$
+                results.append({
+                    "chain": chain_name,
+                    "symbol": token_info["symbol"],
+                    "address": token_addr,
+                    "balance": current_balance,
+                    "decimals": token_info["decimals"],
+                    "price": price,
+                    "usd_value": usd_value
+                })
+                print(f"  ✅ {token_info['symbol']}: ${usd_value:.2f}")
     
     return results
 
@@ -254,13 +214,13 @@ def main():
             
             total_value += chain_value
             
-            # Pause entre les requêtes pour éviter le rate limiting
-            time.sleep(1)
-            
         except Exception as e:
             print(f"❌ Erreur pour {chain_name}: {e}")
             print()
     
+    # Laisser les rafraîchissements d'index en cours se terminer
+    wait_background()
+    
     # Résumé final
     print("=" * 60)
     print("📈 RÉSUMÉ FINAL")
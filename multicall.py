@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Lecture groupée des balances via Multicall3 (aggregate3)
+• balanceOf(wallet) de tous les tokens + getEthBalance natif
+• Découpage automatique en lots, décodage en bloc
+"""
+
+import os
+
+# Même adresse sur toutes les chaînes EVM supportées
+MULTICALL3 = "0xcA11bde05977b3631167028862bE2a173976CA11"
+NATIVE_TOKEN = "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee"
+
+# Nombre de sous-appels par eth_call (MULTICALL_CHUNK_SIZE)
+CHUNK_SIZE = int(os.getenv("MULTICALL_CHUNK_SIZE", "300"))
+
+# Sélecteurs keccak256(signature)[:4] : constants, évite d'importer web3 au chargement
+AGGREGATE3 = bytes.fromhex("82ad56cb")        # aggregate3((address,bool,bytes)[])
+BALANCE_OF = bytes.fromhex("70a08231")        # balanceOf(address)
+GET_ETH_BALANCE = bytes.fromhex("4d2301cc")   # getEthBalance(address)
+
+def aggregate3(w3, calls, block_identifier="latest"):
+    """Exécute des (target, callData) en un eth_call ; renvoie [(succès, données)]"""
+    from eth_abi import encode, decode
+    payload = AGGREGATE3 + encode(["(address,bool,bytes)[]"],
+                                  [[(target, True, data) for target, data in calls]])
+    raw = w3.eth.call({"to": MULTICALL3, "data": payload}, block_identifier)
+    return decode(["(bool,bytes)[]"], bytes(raw))[0]
+
+def _decode_uint(success, data):
+    return int.from_bytes(data[:32], "big") if success and len(data) >= 32 else 0
+
+def fetch_balances(w3, pairs, block_identifier="latest", strict=False):
+    """Balances de paires (wallet, token) ; token NATIVE_TOKEN = solde natif
+
+    Renvoie {(wallet, token): balance} en minuscules ; 0 si l'appel échoue.
+    strict=True : un échec de l'appel aggregate3 lui-même est propagé
+    (résultat destiné à être mis en cache).
+    """
+    from eth_abi import encode
+    from web3 import Web3
+    pairs = list(dict.fromkeys((w.lower(), t.lower()) for w, t in pairs))
+    calls = []
+    for wallet, token in pairs:
+        arg = encode(["address"], [Web3.to_checksum_address(wallet)])
+        if token == NATIVE_TOKEN:
+            calls.append((MULTICALL3, GET_ETH_BALANCE + arg))
+        else:
+            calls.append((Web3.to_checksum_address(token), BALANCE_OF + arg))
+
+    balances = {}
+    for i in range(0, len(calls), CHUNK_SIZE):
+        chunk_pairs = pairs[i:i + CHUNK_SIZE]
+        try:
+            results = aggregate3(w3, calls[i:i + CHUNK_SIZE], block_identifier)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"  ⚠️  Erreur Multicall3 ({len(chunk_pairs)} appels): {e}")
+            results = [(False, b"")] * len(chunk_pairs)
+        for pair, (success, data) in zip(chunk_pairs, results):
+            balances[pair] = _decode_uint(success, data)
+    return balances
+
+def wallet_balances(w3, wallet, tokens, include_native=True, block_identifier="latest",
+                    strict=False):
+    """Balances d'un wallet : (solde natif, {token: balance})"""
+    wallet = wallet.lower()
+    tokens = [t.lower() for t in tokens]
+    pairs = [(wallet, t) for t in tokens]
+    if include_native:
+        pairs.append((wallet, NATIVE_TOKEN))
+    found = fetch_balances(w3, pairs, block_identifier, strict)
+    native = found.get((wallet, NATIVE_TOKEN), 0) if include_native else 0
+    return native, {t: found.get((wallet, t), 0) for t in tokens}
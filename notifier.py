@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Notifications de changement par clé : un observateur n'est réveillé que
+par les mises à jour de la clé qu'il suit (ex. flux SSE d'une analyse)
+"""
+
+import threading
+from contextlib import contextmanager
+
+class Watch:
+    """Version d'une clé suivie ; wait() rend la main au prochain changement"""
+
+    def __init__(self, lock):
+        self._cond = threading.Condition(lock)
+        self.version = 0
+        self.watchers = 0
+
+    def current(self):
+        with self._cond:
+            return self.version
+
+    def wait(self, seen, timeout=None):
+        """Attend que la version dépasse `seen` ; False si le délai expire"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version != seen, timeout)
+
+class ChangeNotifier:
+    """Une condition (et une version) par clé suivie, libérée avec le
+    dernier observateur ; notify() sur une clé non suivie ne coûte rien"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watches = {}
+
+    def notify(self, key):
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is not None:
+                watch.version += 1
+                watch._cond.notify_all()
+
+    @contextmanager
+    def watch(self, key):
+        """Suit une clé le temps du bloc with (Watch)"""
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                watch = self._watches[key] = Watch(self._lock)
+            watch.watchers += 1
+        try:
+            yield watch
+        finally:
+            with self._lock:
+                watch.watchers -= 1
+                if not watch.watchers:
+                    del self._watches[key]
+
+    def watched(self):
+        """Nombre de clés suivies"""
+        with self._lock:
+            return len(self._watches)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Registre de providers Web3 réutilisables (un par endpoint RPC)
+• Session HTTP keep-alive partagée par endpoint
+• Cache des objets contrat (adresse + ABI)
+• Santé marquée paresseusement : pas de sonde is_connected()
+• Chaque requête RPC passe par le limiteur partagé
+"""
+
+import json
+import threading
+import time
+from typing import TYPE_CHECKING
+import requests
+from rate_limit import ThrottledSession
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+ERC20_BALANCE_ABI = [{"constant":True,"inputs":[{"name":"_owner","type":"address"}],"name":"balanceOf","outputs":[{"name":"balance","type":"uint256"}],"type":"function"}]
+
+# Durée (s) pendant laquelle un endpoint en échec est évité
+UNHEALTHY_COOLDOWN = 30
+RPC_TIMEOUT = 10
+
+class ProviderRegistry:
+    """Web3 + session keep-alive par URL RPC, avec repli sur les endpoints sains"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._web3 = {}          # url → Web3
+        self._contracts = {}     # (url, adresse, abi) → contrat
+        self._unhealthy = {}     # url → fin du cooldown
+
+    def web3(self, rpc_url: str) -> "Web3":
+        """Client Web3 partagé pour cet endpoint (créé une seule fois)"""
+        from web3 import Web3     # import différé : web3 est lourd à charger
+        with self._lock:
+            w3 = self._web3.get(rpc_url)
+            if w3 is None:
+                session = ThrottledSession()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=32)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                w3 = Web3(Web3.HTTPProvider(rpc_url, request_kwargs={"timeout": RPC_TIMEOUT},
+                                            session=session))
+                self._web3[rpc_url] = w3
+            return w3
+
+    def contract(self, rpc_url: str, address: str, abi=ERC20_BALANCE_ABI):
+        """Objet contrat mis en cache (évite de reconstruire l'ABI à chaque appel)"""
+        key = (rpc_url, address.lower(), json.dumps(abi, sort_keys=True))
+        with self._lock:
+            contract = self._contracts.get(key)
+        if contract is None:
+            from web3 import Web3
+            contract = self.web3(rpc_url).eth.contract(
+                address=Web3.to_checksum_address(address), abi=abi)
+            with self._lock:
+                self._contracts[key] = contract
+        return contract
+
+    def is_healthy(self, rpc_url: str) -> bool:
+        with self._lock:
+            return self._unhealthy.get(rpc_url, 0) <= time.monotonic()
+
+    def mark_unhealthy(self, rpc_url: str):
+        with self._lock:
+            self._unhealthy[rpc_url] = time.monotonic() + UNHEALTHY_COOLDOWN
+
+    def mark_healthy(self, rpc_url: str):
+        with self._lock:
+            self._unhealthy.pop(rpc_url, None)
+
+    def call(self, rpc_urls, fn):
+        """Appelle fn(w3) sur le premier endpoint sain ; repli sur les suivants en cas d'échec"""
+        if isinstance(rpc_urls, str):
+            rpc_urls = [rpc_urls]
+        ordered = ([u for u in rpc_urls if self.is_healthy(u)]
+                   + [u for u in rpc_urls if not self.is_healthy(u)])
+        error = None
+        for rpc_url in ordered:
+            try:
+                result = fn(self.web3(rpc_url))
+                self.mark_healthy(rpc_url)
+                return result
+            except Exception as e:
+                self.mark_unhealthy(rpc_url)
+                error = e
+        raise error or ValueError("Aucun endpoint RPC")
+
+# Registre partagé par tout le processus
+REGISTRY = ProviderRegistry()
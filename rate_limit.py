@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Limiteur token-bucket partagé, par hôte amont et clé API
+• Thread-safe (acquire) et compatible asyncio (acquire_async)
+• Limites par fournisseur, surchargeables via RATE_LIMITS
+  ex. RATE_LIMITS="api.etherscan.io=5/5,coins.llama.fi=20/20"  (req/s / rafale)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+
+PROVIDER_LIMITS = {                  # hôte → (requêtes/s, rafale)
+    "api.etherscan.io":   (5, 5),     # 5 req/s par clé (offre gratuite)
+    "coins.llama.fi":     (10, 10),
+    "api.coingecko.com":  (0.5, 5),   # ~30 req/min sans clé
+    "api.covalenthq.com": (4, 4),
+}
+DEFAULT_LIMIT = (20, 20)
+
+def _parse_overrides(spec):
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        host, _, value = item.partition("=")
+        rate, _, burst = value.partition("/")
+        limits[host.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+PROVIDER_LIMITS.update(_parse_overrides(os.getenv("RATE_LIMITS", "")))
+
+class TokenBucket:
+    """Seau de jetons : `rate` jetons/s, au plus `capacity` en réserve"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Réserve un jeton ; renvoie le délai à attendre avant de l'utiliser"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def share_between(processes: int):
+    """Répartit les limites entre `processes` processus utilisant les mêmes
+    clés API (workers d'un serveur pré-forké) : 1/processes du débit chacun"""
+    global DEFAULT_LIMIT, _buckets_lock
+    if processes <= 1:
+        return
+    for host, (rate, burst) in PROVIDER_LIMITS.items():
+        PROVIDER_LIMITS[host] = (rate / processes, max(1.0, burst / processes))
+    DEFAULT_LIMIT = (DEFAULT_LIMIT[0] / processes, max(1.0, DEFAULT_LIMIT[1] / processes))
+    # Seaux hérités du parent recréés avec les nouvelles limites
+    _buckets_lock = threading.Lock()
+    _buckets.clear()
+
+def bucket_for(url: str, api_key: str = None) -> TokenBucket:
+    """Seau partagé pour (hôte, clé API)"""
+    host = urlparse(url).hostname or url
+    with _buckets_lock:
+        bucket = _buckets.get((host, api_key))
+        if bucket is None:
+            bucket = _buckets[(host, api_key)] = TokenBucket(*PROVIDER_LIMITS.get(host, DEFAULT_LIMIT))
+        return bucket
+
+def throttle(url: str, api_key: str = None):
+    """Attend un jeton pour cet hôte / cette clé (bloquant)"""
+    bucket_for(url, api_key).acquire()
+
+async def throttle_async(url: str, api_key: str = None):
+    """Attend un jeton pour cet hôte / cette clé (asyncio)"""
+    await bucket_for(url, api_key).acquire_async()
+
+class ThrottledSession(requests.Session):
+    """Session requests dont chaque requête passe par le limiteur (ex. RPC Web3)"""
+
+    def request(self, method, url, *args, **kwargs):
+        throttle(url)
+        return super().request(method, url, *args, **kwargs)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Script de lancement pour Beta Portfolio Analyzer
+• python run.py         serveur de développement
+• python run.py --prod  serveur de production (gunicorn, hors Windows)
 """
 
 import os
@@ -30,13 +32,24 @@ def main():
     subprocess.run([python_path, "-m", "pip", "install", "-r", "requirements.txt"], check=True)
     
     # Lancer l'application
+    prod = "--prod" in sys.argv[1:]
+    if prod and platform.system() == "Windows":
+        print("⚠️  gunicorn n'est pas disponible sous Windows, serveur de développement")
+        prod = False
+    
     print("🌐 Démarrage du serveur web...")
-    print("📍 L'application sera disponible sur: http://localhost:8080")
+    print(f"📍 L'application sera disponible sur: http://localhost:{os.getenv('PORT', '8080') if prod else 8080}")
     print("🔄 Appuyez sur Ctrl+C pour arrêter le serveur")
     print("-" * 50)
     
+    if prod:
+        # Workers, threads, préchargement... : variables WEB_* (gunicorn.conf.py)
+        command = [python_path, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"]
+    else:
+        command = [python_path, "app.py"]
+    
     try:
-        subprocess.run([python_path, "app.py"], check=True)
+        subprocess.run(command, check=True)
     except KeyboardInterrupt:
         print("\n👋 Arrêt du serveur...")
     except subprocess.CalledProcessError as e:
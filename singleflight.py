@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Single-flight : les appels concurrents sur une même clé partagent
+une seule requête amont en cours et son résultat (ou son erreur)
+"""
+
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Regroupe les appels identiques en vol (clé hashable → un seul appel)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0        # nombre d'appels servis par une requête déjà en vol
+
+    def do(self, key, fn, *args, **kwargs):
+        """Exécute fn une seule fois par clé en vol ; les autres appelants attendent"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+# Groupe partagé par tout le processus (clés préfixées par la source amont)
+UPSTREAM = SingleFlight()
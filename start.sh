@@ -1,4 +1,39 @@
 #!/bin/bash
+# Usage : ./start.sh        serveur de développement (Flask, rechargement auto)
+#         ./start.sh prod   serveur de production (gunicorn, workers pré-forkés)
+#         ./start.sh reload redémarrage gracieux du serveur de production
+
+MODE=${1:-dev}
+PIDFILE=${WEB_PIDFILE:-gunicorn.pid}
+
+if [ "$MODE" = "reload" ]; then
+    if [ ! -f "$PIDFILE" ] || ! kill -0 "$(cat "$PIDFILE")" 2>/dev/null; then
+        echo "❌ Aucun serveur de production en cours ($PIDFILE)"
+        exit 1
+    fi
+    old_pid=$(cat "$PIDFILE")
+    echo "🔄 Redémarrage gracieux (maître $old_pid)..."
+    # USR2 : nouveau maître avec le nouveau code, sur le même socket
+    # (son pid est écrit dans $PIDFILE.2 jusqu'à l'arrêt de l'ancien)
+    kill -USR2 "$old_pid"
+    new_pid=""
+    for i in $(seq 1 60); do
+        if [ -f "$PIDFILE.2" ]; then
+            new_pid=$(cat "$PIDFILE.2")
+            # Prêt dès que ses workers sont lancés (après le préchargement)
+            pgrep -P "$new_pid" > /dev/null 2>&1 && break
+        fi
+        sleep 1
+    done
+    if [ -z "$new_pid" ] || ! pgrep -P "$new_pid" > /dev/null 2>&1; then
+        echo "❌ Le nouveau maître n'a pas démarré, ancien serveur conservé"
+        exit 1
+    fi
+    # TERM : l'ancien maître termine ses requêtes en cours puis s'arrête
+    kill -TERM "$old_pid"
+    echo "✅ Nouveau maître $new_pid en service"
+    exit 0
+fi
 
 echo "🚀 Lancement de Beta Portfolio Analyzer..."
 
@@ -22,6 +57,13 @@ source .venv/bin/activate
 echo "📦 Installation des dépendances..."
 pip install -r requirements.txt
 
+# Serveur de production déjà lancé : ne pas le tuer en libérant le port
+if [ -f "$PIDFILE" ] && kill -0 "$(cat "$PIDFILE")" 2>/dev/null; then
+    echo "⚠️  Serveur de production déjà en cours (maître $(cat "$PIDFILE"))"
+    echo "   ./start.sh reload pour le redémarrer, ./stop.sh pour l'arrêter"
+    exit 1
+fi
+
 # Vérifier et libérer le port si nécessaire
 echo "🔍 Vérification des ports..."
 if lsof -ti:8080 > /dev/null 2>&1; then
@@ -32,6 +74,13 @@ fi
 
 # Lancer l'application
 echo "🌐 Démarrage du serveur web..."
+if [ "$MODE" = "prod" ]; then
+    # Workers, threads, préchargement... : variables WEB_* (gunicorn.conf.py)
+    echo "📍 L'application sera disponible sur: http://localhost:${PORT:-8080}"
+    echo "🔄 Ctrl+C ou ./stop.sh pour arrêter, ./start.sh reload pour redémarrer"
+    echo "----------------------------------------"
+    exec gunicorn -c gunicorn.conf.py app:app
+fi
 echo "📍 L'application sera disponible sur: http://localhost:8080 (ou port suivant)"
 echo "🔄 Appuyez sur Ctrl+C pour arrêter le serveur"
 echo "----------------------------------------"
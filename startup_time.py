@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Mesure du démarrage à froid de l'application
+• Temps d'import de app + create_app(), puis 1re requête sur / et /api/chains
+• Mémoire max (RSS) du processus après ces requêtes
+• Bibliothèques lourdes chargées (ne doivent apparaître qu'à la 1re analyse)
+Chaque essai tourne dans un nouveau processus Python (cache d'import vide).
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = int(os.getenv("STARTUP_RUNS", "5"))
+HEAVY_MODULES = ["pandas", "numpy", "web3", "eth_account", "eth_abi", "tqdm", "aiohttp"]
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+flask_app = app.create_app()
+imported = time.perf_counter()
+client = flask_app.test_client()
+statuses = [client.get(path).status_code for path in ("/", "/api/chains")]
+served = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - started,
+    "first_request_s": served - imported,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "statuses": statuses,
+    "heavy": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+def measure_once() -> dict:
+    """Un démarrage à froid dans un sous-processus"""
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    print(f"⏱️  Démarrage à froid de app.py ({RUNS} essais)")
+    print("=" * 60)
+    runs = []
+    for i in range(RUNS):
+        run = measure_once()
+        runs.append(run)
+        print(f"  #{i + 1}: import {run['import_s'] * 1000:.0f} ms | "
+              f"1res requêtes {run['first_request_s'] * 1000:.0f} ms | "
+              f"RSS {run['rss_mb']:.0f} Mo | HTTP {run['statuses']}")
+
+    print("=" * 60)
+    print(f"📊 Import médian : {statistics.median(r['import_s'] for r in runs) * 1000:.0f} ms")
+    print(f"📊 1res requêtes médian : {statistics.median(r['first_request_s'] for r in runs) * 1000:.0f} ms")
+    print(f"📊 RSS médian : {statistics.median(r['rss_mb'] for r in runs):.0f} Mo")
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+    if heavy:
+        print(f"⚠️  Bibliothèques lourdes chargées au démarrage : {', '.join(heavy)}")
+    else:
+        print("✅ Aucune bibliothèque lourde chargée au démarrage")
+
+if __name__ == "__main__":
+    main()
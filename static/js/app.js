@@ -148,6 +148,11 @@ analyzeBtn.addEventListener('click', async function() {
             })
         });
         
+        if (response.status === 429) {
+            // Server busy: queue full
+            const busy = await response.json();
+            throw new Error(`Server busy, please retry in ~${busy.retry_after}s`);
+        }
         if (!response.ok) {
             throw new Error(`HTTP Error: ${response.status}`);
         }
@@ -155,8 +160,8 @@ analyzeBtn.addEventListener('click', async function() {
         const data = await response.json();
         const analysisId = data.analysis_id;
         
-        // Polling for AI results
-        await pollResults(analysisId);
+        // Live AI results (Server-Sent Events, polling fallback)
+        watchResults(analysisId);
         
     } catch (error) {
         console.error('AI Analysis error:', error);
@@ -166,9 +171,103 @@ analyzeBtn.addEventListener('click', async function() {
     }
 });
 
+const MAX_WAIT_SECONDS = 60; // 60 seconds max
+let renderedPartial = null; // last partial result displayed
+
+// Update the progress bar (server progress if known, otherwise elapsed time)
+function updateProgress(data, elapsedSeconds) {
+    const progress = data.progress !== undefined
+        ? data.progress
+        : Math.min((elapsedSeconds / MAX_WAIT_SECONDS) * 100, 95);
+    document.getElementById('progress-fill').style.width = progress + '%';
+    const chains = data.chains_total
+        ? ` - ${data.chains_done.length}/${data.chains_total} chains`
+        : '';
+    progressText.textContent = `AI is analyzing your portfolio... (${Math.round(progress)}%)${chains}`;
+}
+
+// Handle a status payload; returns true once the analysis is finished
+function handleStatus(data, elapsedSeconds) {
+    if (data.status === 'completed') {
+        // AI Analysis completed
+        progressBar.classList.add('hidden');
+        analyzeBtn.disabled = false;
+        displayResults(data.result);
+        return true;
+    } else if (data.status === 'error') {
+        // Error
+        progressBar.classList.add('hidden');
+        analyzeBtn.disabled = false;
+        showError('AI Analysis error: ' + data.error);
+        return true;
+    } else if (data.status === 'queued') {
+        // Waiting for a free worker: the timeout does not apply yet
+        progressText.textContent = `Waiting in queue (position ${data.queue_position}, ~${data.estimated_wait}s)...`;
+        return false;
+    } else if (elapsedSeconds >= MAX_WAIT_SECONDS) {
+        progressBar.classList.add('hidden');
+        analyzeBtn.disabled = false;
+        showError('Timeout - AI analysis is taking too long');
+        return true;
+    }
+    
+    // In progress: show the partial score of the chains already scanned
+    if (data.partial && data.result && data.result !== renderedPartial) {
+        renderedPartial = data.result;
+        displayResults(data.result);
+    }
+    updateProgress(data, elapsedSeconds);
+    return false;
+}
+
+// Results stream: updates pushed by the server as soon as they exist
+function watchResults(analysisId) {
+    if (!window.EventSource) {
+        pollResults(analysisId);
+        return;
+    }
+    
+    let startedAt = Date.now();
+    const elapsed = () => (Date.now() - startedAt) / 1000;
+    const source = new EventSource(`/api/stream/${analysisId}`);
+    let finished = false;
+    let lastStatus = { status: 'running' };
+    
+    // Keep the progress bar moving between server updates
+    const ticker = setInterval(() => {
+        if (!finished && handleStatus(lastStatus, elapsed())) {
+            finished = true;
+            source.close();
+            clearInterval(ticker);
+        }
+    }, 1000);
+    
+    source.onmessage = (event) => {
+        lastStatus = JSON.parse(event.data);
+        if (lastStatus.status === 'queued') {
+            // Time spent in the queue does not count towards the timeout
+            startedAt = Date.now();
+        }
+        if (handleStatus(lastStatus, elapsed())) {
+            finished = true;
+            source.close();
+            clearInterval(ticker);
+        }
+    };
+    
+    source.onerror = () => {
+        // Stream unavailable or interrupted: fall back to polling
+        source.close();
+        clearInterval(ticker);
+        if (!finished) {
+            finished = true;
+            pollResults(analysisId);
+        }
+    };
+}
+
 // Results polling
 async function pollResults(analysisId) {
-    const maxAttempts = 60; // 60 seconds max
     let attempts = 0;
     
     const poll = async () => {
@@ -176,33 +275,9 @@ async function pollResults(analysisId) {
             const response = await fetch(`/api/status/${analysisId}`);
             const data = await response.json();
             
-            if (data.status === 'completed') {
-                // AI Analysis completed
-                progressBar.classList.add('hidden');
-                analyzeBtn.disabled = false;
-                displayResults(data.result);
-                return;
-            } else if (data.status === 'error') {
-                // Error
-                progressBar.classList.add('hidden');
-                analyzeBtn.disabled = false;
-                showError('AI Analysis error: ' + data.error);
-                return;
-            } else {
-                // In progress
-                attempts++;
-                if (attempts >= maxAttempts) {
-                    progressBar.classList.add('hidden');
-                    analyzeBtn.disabled = false;
-                    showError('Timeout - AI analysis is taking too long');
-                    return;
-                }
-                
-                // Update progress
-                const progress = Math.min((attempts / maxAttempts) * 100, 95);
-                document.getElementById('progress-fill').style.width = progress + '%';
-                progressText.textContent = `AI is analyzing your portfolio... (${Math.round(progress)}%)`;
-                
+            // Time spent in the queue does not count towards the timeout
+            attempts = data.status === 'queued' ? 0 : attempts + 1;
+            if (!handleStatus(data, attempts)) {
                 // Continue polling
                 setTimeout(poll, 1000);
             }
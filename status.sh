@@ -15,10 +15,26 @@ echo ""
 echo "🐍 Processus Python :"
 python_processes=$(ps aux | grep "python.*app.py" | grep -v grep)
 if [ ! -z "$python_processes" ]; then
-    echo "✅ Application en cours d'exécution :"
+    echo "✅ Application en cours d'exécution (développement) :"
     echo "$python_processes"
 else
-    echo "❌ Aucune application en cours d'exécution"
+    echo "ℹ️  Aucun serveur de développement en cours"
+fi
+
+# Serveur de production (gunicorn)
+echo ""
+echo "🏭 Serveur de production :"
+PIDFILE=${WEB_PIDFILE:-gunicorn.pid}
+if [ -f "$PIDFILE" ] && kill -0 "$(cat "$PIDFILE")" 2>/dev/null; then
+    master=$(cat "$PIDFILE")
+    workers=$(pgrep -P "$master" | wc -l | tr -d ' ')
+    echo "✅ Maître gunicorn $master, $workers worker(s)"
+    ps -o pid,rss,etime,args -p "$master" $(pgrep -P "$master" | sed 's/^/-p /')
+    if [ -f "$PIDFILE.2" ]; then
+        echo "🔄 Redémarrage en cours (nouveau maître $(cat "$PIDFILE.2"))"
+    fi
+else
+    echo "ℹ️  Aucun serveur de production en cours"
 fi
 
 # Vérifier les ports utilisés
@@ -41,7 +57,7 @@ if [ -f "requirements.txt" ]; then
     if [ -d ".venv" ]; then
         echo "🔍 Vérification des packages installés..."
         source .venv/bin/activate
-        pip list | grep -E "(flask|web3|pandas|numpy)" || echo "⚠️  Certaines dépendances manquent"
+        pip list | grep -E "(flask|web3|pandas|numpy|gunicorn)" || echo "⚠️  Certaines dépendances manquent"
     fi
 else
     echo "❌ requirements.txt manquant"
@@ -62,6 +78,7 @@ fi
 
 echo ""
 echo "🎯 Actions recommandées :"
-echo "  - Pour démarrer : ./start.sh"
+echo "  - Pour démarrer : ./start.sh (production : ./start.sh prod)"
+echo "  - Redémarrage gracieux (production) : ./start.sh reload"
 echo "  - Pour arrêter : ./stop.sh"
 echo "  - Pour redémarrer : ./stop.sh && ./start.sh"
@@ -2,6 +2,39 @@
 
 echo "🛑 Arrêt de Beta Portfolio Analyzer..."
 
+# Serveur de production (gunicorn) : arrêt gracieux via le(s) maître(s)
+# Pendant un ./start.sh reload, USR2 renomme le pidfile de l'ancien maître
+# en $PIDFILE.oldbin et le nouveau écrit le sien dans $PIDFILE.2
+PIDFILE=${WEB_PIDFILE:-gunicorn.pid}
+masters=""
+for file in "$PIDFILE" "$PIDFILE.2" "$PIDFILE.oldbin"; do
+    if [ -f "$file" ] && kill -0 "$(cat "$file")" 2>/dev/null; then
+        master=$(cat "$file")
+        echo "📍 Arrêt gracieux du serveur de production (maître $master, $file)..."
+        kill -TERM "$master"
+        masters="$masters $master"
+    fi
+done
+if [ -n "$masters" ]; then
+    # Les requêtes en cours ont WEB_GRACEFUL_TIMEOUT secondes pour se terminer
+    for i in $(seq 1 $(( ${WEB_GRACEFUL_TIMEOUT:-30} + 5 ))); do
+        running=""
+        for master in $masters; do
+            kill -0 "$master" 2>/dev/null && running="$running $master"
+        done
+        [ -z "$running" ] && break
+        sleep 1
+    done
+    for master in $masters; do
+        if kill -0 "$master" 2>/dev/null; then
+            echo "⚠️  Arrêt forcé du maître $master"
+            kill -9 "$master"
+        fi
+    done
+    echo "✅ Serveur de production arrêté"
+fi
+rm -f "$PIDFILE" "$PIDFILE.2" "$PIDFILE.oldbin"
+
 # Trouver et arrêter les processus Python qui utilisent le port 8080
 if lsof -ti:8080 > /dev/null 2>&1; then
     echo "📍 Arrêt des processus sur le port 8080..."
@@ -13,7 +46,7 @@ fi
 
 # Arrêter tous les processus Python liés à l'application
 echo "🔍 Recherche d'autres processus de l'application..."
-pids=$(ps aux | grep "python.*app.py" | grep -v grep | awk '{print $2}')
+pids=$(ps aux | grep -E "python.*app.py|gunicorn.*app:app" | grep -v grep | awk '{print $2}')
 
 if [ ! -z "$pids" ]; then
     echo "📍 Arrêt des processus Python de l'application..."
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test de multicall.py contre un nœud JSON-RPC local factice (sans réseau)
+• Encodage : sélecteurs, cibles et wallets décodés côté nœud
+• Découpage : un eth_call aggregate3 par lot de CHUNK_SIZE sous-appels
+• Sous-appels en échec (et eth_call en échec) décodés à 0
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode, encode
+from web3 import Web3
+
+import multicall
+
+WALLET = "0x1c633eb00291398589718daa3938a6bd4f71949c"
+NATIVE_BALANCE = 5 * 10**18
+
+# Nœud factice : balanceOf renvoie (4 derniers chiffres hex du token + 1) ETH,
+# les tokens finissant par "dead" échouent, getEthBalance renvoie NATIVE_BALANCE
+node = {"eth_calls": 0, "sizes": [], "wallets": set(), "fail": False}
+
+def token_balance(token):
+    return (int(token[-4:], 16) + 1) * 10**18
+
+class FakeNode(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        reply = {"jsonrpc": "2.0", "id": req["id"]}
+        if req["method"] == "eth_chainId":
+            reply["result"] = "0x1"
+        elif req["method"] == "eth_call" and node["fail"]:
+            reply["error"] = {"code": -32000, "message": "execution reverted"}
+        elif req["method"] == "eth_call":
+            tx = req["params"][0]
+            data = bytes.fromhex(tx["data"][2:])
+            assert tx["to"].lower() == multicall.MULTICALL3.lower()
+            assert data[:4] == multicall.AGGREGATE3
+            calls = decode(["(address,bool,bytes)[]"], data[4:])[0]
+            node["eth_calls"] += 1
+            node["sizes"].append(len(calls))
+            results = []
+            for target, allow_failure, call_data in calls:
+                assert allow_failure
+                node["wallets"].add(decode(["address"], call_data[4:])[0].lower())
+                if call_data[:4] == multicall.GET_ETH_BALANCE:
+                    assert target.lower() == multicall.MULTICALL3.lower()
+                    results.append((True, encode(["uint256"], [NATIVE_BALANCE])))
+                elif call_data[:4] != multicall.BALANCE_OF or target.lower().endswith("dead"):
+                    results.append((False, b""))
+                else:
+                    results.append((True, encode(["uint256"], [token_balance(target.lower())])))
+            reply["result"] = "0x" + encode(["(bool,bytes)[]"], [results]).hex()
+        else:
+            reply["error"] = {"code": -32601, "message": "method not found"}
+        body = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_node():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeNode)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, Web3(Web3.HTTPProvider(f"http://127.0.0.1:{server.server_port}"))
+
+def reset_node():
+    node.update(eth_calls=0, sizes=[], wallets=set(), fail=False)
+
+def test_multicall():
+    """Encodage, découpage en lots et échecs décodés à 0"""
+    server, w3 = start_node()
+    chunk_size = multicall.CHUNK_SIZE
+    try:
+        print("🔧 Nœud JSON-RPC factice démarré")
+        print("=" * 60)
+
+        # 1. Sélecteurs = keccak256(signature)[:4]
+        for selector, signature in ((multicall.AGGREGATE3, "aggregate3((address,bool,bytes)[])"),
+                                    (multicall.BALANCE_OF, "balanceOf(address)"),
+                                    (multicall.GET_ETH_BALANCE, "getEthBalance(address)")):
+            assert selector == Web3.keccak(text=signature)[:4], signature
+        print("✅ Sélecteurs conformes aux signatures")
+
+        # 2. Encodage : balances décodées, sous-appel en échec → 0
+        tokens = [f"0x{i:040x}" for i in range(1, 5)] + ["0x" + "1" * 36 + "dead"]
+        reset_node()
+        native, found = multicall.wallet_balances(w3, WALLET, tokens)
+        assert native == NATIVE_BALANCE
+        for token in tokens[:-1]:
+            assert found[token] == token_balance(token), token
+        assert found[tokens[-1]] == 0
+        assert node["wallets"] == {WALLET}
+        assert node["eth_calls"] == 1 and node["sizes"] == [len(tokens) + 1]
+        print(f"✅ {len(tokens)} tokens + natif en 1 eth_call, sous-appel en échec → 0")
+
+        # 3. Découpage : 201 paires = 1 eth_call avec des lots de 300, 3 avec des lots de 100
+        pairs = [(WALLET, f"0x{i:040x}") for i in range(1, 201)] + [(WALLET, multicall.NATIVE_TOKEN)]
+        for size, expected in ((300, [201]), (100, [100, 100, 1])):
+            multicall.CHUNK_SIZE = size
+            reset_node()
+            balances = multicall.fetch_balances(w3, pairs)
+            assert sorted(node["sizes"], reverse=True) == expected, (size, node["sizes"])
+            assert len(balances) == len(pairs)
+            assert balances[(WALLET, multicall.NATIVE_TOKEN)] == NATIVE_BALANCE
+            assert balances[(WALLET, "0x" + "0" * 37 + "0c8")] == token_balance("00c8")
+            print(f"✅ {len(pairs)} appels, lots de {size} : {node['eth_calls']} eth_call(s) {node['sizes']}")
+
+        # 4. eth_call en échec : 0 pour tout le lot, propagé en mode strict
+        multicall.CHUNK_SIZE = chunk_size
+        reset_node()
+        node["fail"] = True
+        native, found = multicall.wallet_balances(w3, WALLET, tokens[:2])
+        assert native == 0 and set(found.values()) == {0}
+        try:
+            multicall.wallet_balances(w3, WALLET, tokens[:2], strict=True)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("strict=True doit propager l'échec")
+        print("✅ eth_call en échec : balances à 0, propagé avec strict=True")
+    finally:
+        multicall.CHUNK_SIZE = chunk_size
+        server.shutdown()
+
+    print("=" * 60)
+    print("✅ Multicall3 OK")
+
+if __name__ == "__main__":
+    test_multicall()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Test de tokentx.py contre une API Etherscan locale factice (sans réseau)
+• Lecture en streaming : transferts (et caractères UTF-8) coupés entre deux
+  paquets, réponses indentées, "No transactions found"
+• Réponse plafonnée : le dernier bloc, peut-être incomplet, est écarté
+• NOTOK "Max rate limit reached" rejoué avec backoff, puis propagé
+• Historique en shards : shards terminés dans le désordre, balances
+  fusionnés dans l'ordre des blocs (mêmes résultats qu'en une requête)
+"""
+
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_client
+import tokentx
+
+WALLET = "0x1c633eb00291398589718daa3938a6bd4f71949c"
+OTHER = "0x00000000000000000000000000000000000000aa"
+TOKEN = "0x00000000000000000000000000000000000000ee"
+
+def transfer(block, value, incoming=True, name="Éclair ☀"):
+    return {
+        "blockNumber": str(block),
+        "contractAddress": TOKEN,
+        "from": OTHER if incoming else WALLET,
+        "to": WALLET if incoming else OTHER,
+        "value": str(value),
+        "tokenSymbol": "ECL",
+        "tokenName": name,
+        "tokenDecimal": "18"
+    }
+
+# API factice : tokentx (ordre croissant, au plus node["cap"] transferts),
+# node["rate_limited"] réponses NOTOK avant la première réponse normale,
+# node["delay"](startblock) secondes d'attente par requête ; proxy
+# eth_blockNumber renvoie node["head"] (None : indisponible)
+node = {"transfers": [], "cap": 10000, "indent": None, "rate_limited": 0, "requests": 0,
+        "delay": None, "head": 0}
+
+class FakeEtherscan(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+        node["requests"] += 1
+        if query.get("module") == "proxy":
+            head = node["head"]
+            body = {"jsonrpc": "2.0", "id": 83, "result": hex(head) if head is not None else None}
+        elif node["rate_limited"] > 0:
+            node["rate_limited"] -= 1
+            body = {"status": "0", "message": "NOTOK", "result": "Max rate limit reached"}
+        else:
+            start, end = int(query["startblock"]), int(query["endblock"])
+            if node["delay"]:
+                time.sleep(node["delay"](start))
+            found = [tx for tx in node["transfers"] if start <= int(tx["blockNumber"]) <= end]
+            found = sorted(found, key=lambda tx: int(tx["blockNumber"]))[:node["cap"]]
+            if found:
+                body = {"status": "1", "message": "OK", "result": found}
+            else:
+                body = {"status": "0", "message": "No transactions found", "result": []}
+        payload = json.dumps(body, indent=node["indent"], ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def start_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEtherscan)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, {"url": f"http://127.0.0.1:{server.server_port}/api", "key": "test"}
+
+def reset_api(transfers, **options):
+    node.update(transfers=transfers, cap=10000, indent=None, rate_limited=0, requests=0,
+                delay=None, head=0)
+    node.update(options)
+
+def test_stream_parser():
+    """Transferts coupés à toutes les positions, indentation, historique vide"""
+    server, api = start_api()
+    chunk_size = tokentx.STREAM_CHUNK_SIZE
+    transfers = [transfer(100 + i, 10**18 + i, incoming=i % 3 != 2) for i in range(25)]
+    try:
+        print("🔧 API Etherscan factice démarrée")
+        print("=" * 60)
+
+        # 1. Paquets de 1 et 7 octets : transferts et caractères multi-octets coupés
+        for size in (1, 7, chunk_size):
+            for indent in (None, 2):
+                tokentx.STREAM_CHUNK_SIZE = size
+                reset_api(transfers, indent=indent)
+                found = list(tokentx.iter_range(api, WALLET, 0))
+                assert found == transfers, (size, indent)
+        print(f"✅ {len(transfers)} transferts relus à l'identique (paquets de 1, 7, {chunk_size} o)")
+
+        # 2. Plage sans transfert : aucun élément, pas d'erreur
+        tokentx.STREAM_CHUNK_SIZE = 7
+        reset_api(transfers)
+        assert list(tokentx.iter_range(api, WALLET, 1000)) == []
+        print("✅ \"No transactions found\" : historique vide")
+    finally:
+        tokentx.STREAM_CHUNK_SIZE = chunk_size
+        server.shutdown()
+
+def test_fold_range_capped():
+    """Réponse plafonnée : le dernier bloc est écarté, plage couverte jusqu'au précédent"""
+    server, api = start_api()
+    max_results = tokentx.TOKENTX_MAX_RESULTS
+    # Blocs 10, 11, 12 puis 3 transferts au bloc 13 : le plafond (5) coupe le bloc 13
+    transfers = [transfer(10, 5), transfer(11, 7), transfer(12, 2, incoming=False),
+                 transfer(13, 1), transfer(13, 1), transfer(13, 1)]
+    try:
+        tokentx.TOKENTX_MAX_RESULTS = 5
+        reset_api(transfers, cap=5)
+        balances, folded, last_block, capped = tokentx.fold_range(api, WALLET, 0)
+        assert capped and folded == 3 and last_block == 12, (folded, last_block, capped)
+        token = balances[TOKEN]
+        assert token["net_balance"] == 5 + 7 - 2
+        assert (token["first_block"], token["last_block"]) == (10, 12)
+        print("✅ Réponse plafonnée : bloc 13 écarté, plage couverte jusqu'au bloc 12")
+
+        # Reprise après le dernier bloc replié : le bloc 13 est relu en entier
+        balances, folded, last_block, capped = tokentx.fold_range(api, WALLET, last_block + 1)
+        assert not capped and folded == 3 and last_block == 13
+        assert balances[TOKEN]["net_balance"] == 3
+        print("✅ Reprise au bloc 13 : ses 3 transferts repliés")
+
+        # Un seul bloc au-delà du plafond : replié tel quel (tronqué), pas de boucle
+        reset_api([transfer(20, 1) for _ in range(6)], cap=5)
+        balances, folded, last_block, capped = tokentx.fold_range(api, WALLET, 20, 20)
+        assert not capped and folded == 5 and last_block == 20
+        print("✅ Bloc unique plafonné : replié tronqué, sans redécoupage")
+    finally:
+        tokentx.TOKENTX_MAX_RESULTS = max_results
+        server.shutdown()
+
+def test_rate_limit_retry():
+    """NOTOK de quota rejoué (backoff) ; propagé après MAX_RETRIES rejeux"""
+    server, api = start_api()
+    backoff_base = http_client.BACKOFF_BASE
+    transfers = [transfer(100 + i, 1) for i in range(3)]
+    try:
+        http_client.BACKOFF_BASE = 0.01
+        reset_api(transfers, rate_limited=2)
+        assert list(tokentx.iter_range(api, WALLET, 0)) == transfers
+        assert node["requests"] == 3
+        print("✅ 2 réponses NOTOK rejouées, transferts lus à la 3e requête")
+
+        reset_api(transfers, rate_limited=http_client.MAX_RETRIES + 1)
+        try:
+            list(tokentx.iter_range(api, WALLET, 0))
+        except ValueError as e:
+            assert "rate limit" in str(e)
+        else:
+            raise AssertionError("le quota dépassé doit être propagé")
+        assert node["requests"] == http_client.MAX_RETRIES + 1
+        print(f"✅ Quota toujours dépassé : erreur après {node['requests']} requêtes")
+    finally:
+        http_client.BACKOFF_BASE = backoff_base
+        server.shutdown()
+
+def test_shards_merge_order():
+    """Shards terminés dans le désordre : fusion dans l'ordre des blocs"""
+    server, api = start_api()
+    max_results, shards = tokentx.TOKENTX_MAX_RESULTS, tokentx.TOKENTX_SHARDS
+    # 60 transferts sur les blocs 100 à 159 (entrées, une sortie sur 4) ;
+    # second token vu une seule fois, dans le premier shard
+    transfers = [transfer(100 + i, 10 + i, incoming=i % 4 != 3) for i in range(60)]
+    early = dict(transfer(130, 4), contractAddress="0x" + "0" * 38 + "ff")
+    transfers.append(early)
+    try:
+        # Référence : tout l'historique en une requête
+        reset_api(transfers)
+        expected, expected_total, expected_last = tokentx.fold_history(api, WALLET)
+        assert expected_total == len(transfers) and expected_last == 159
+
+        # Plafond de 8 transferts, 4 shards : les premiers blocs répondent en dernier
+        tokentx.TOKENTX_MAX_RESULTS, tokentx.TOKENTX_SHARDS = 8, 4
+        reset_api(transfers, cap=8, head=160,
+                  delay=lambda start: 0.02 * max(0, 170 - start) / 10)
+        found, total, last_block = tokentx.fold_history(api, WALLET)
+        assert node["requests"] > 5, node["requests"]
+        assert (total, last_block) == (expected_total, expected_last), (total, last_block)
+        assert found == expected, (found, expected)
+        token = found[TOKEN]
+        assert (token["first_block"], token["last_block"]) == (100, 159)
+        print(f"✅ {total} transferts en {node['requests']} requêtes (shards dans le "
+              f"désordre) : balances et blocs identiques à une seule requête")
+
+        # Reprise depuis un curseur, dernier bloc de la chaîne indisponible
+        # (shards jusqu'à END_BLOCK) : le curseur reste au dernier transfert
+        reset_api([tx for tx in transfers if int(tx["blockNumber"]) < 120], head=None)
+        resumed, _, cursor = tokentx.fold_history(api, WALLET)
+        assert cursor == 119, cursor
+        reset_api(transfers, cap=8, head=160,
+                  delay=lambda start: 0.02 * max(0, 170 - start) / 10)
+        resumed, _, last_block = tokentx.fold_history(api, WALLET, cursor + 1, resumed)
+        assert resumed == expected and last_block == expected_last, (cursor, last_block)
+        print(f"✅ Reprise au bloc {cursor + 1} : balances et blocs identiques")
+    finally:
+        tokentx.TOKENTX_MAX_RESULTS, tokentx.TOKENTX_SHARDS = max_results, shards
+        server.shutdown()
+
+if __name__ == "__main__":
+    test_stream_parser()
+    test_fold_range_capped()
+    test_rate_limit_retry()
+    test_shards_merge_order()
+    print("=" * 60)
+    print("✅ tokentx OK")
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Historique tokentx complet via les APIs Etherscan, replié en balances nets
+• Réponse lue en streaming : chaque transfert est replié dès sa lecture,
+  la mémoire ne croît pas avec la longueur de l'historique
+• Une requête suffit pour la plupart des wallets
+• Au-delà du plafond de 10 000 transferts : plage de blocs découpée en
+  shards repliés en parallèle (dans le budget du limiteur), la partie non
+  couverte d'un shard plafonné étant redécoupée en deux
+• Balances partiels fusionnés dans l'ordre des blocs
+"""
+
+import codecs
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import http_client
+
+# Etherscan renvoie au plus 10 000 transferts par requête tokentx
+TOKENTX_MAX_RESULTS = 10000
+END_BLOCK = 99999999
+
+# Nombre de shards téléchargés en parallèle pour un historique volumineux
+TOKENTX_SHARDS = int(os.getenv("TOKENTX_SHARDS", "4"))
+
+STREAM_CHUNK_SIZE = 64 * 1024
+_RESULT_ARRAY = re.compile(r'"result"\s*:\s*\[')
+_STATUS = re.compile(r'"status"\s*:\s*"(\w*)"')
+_MESSAGE = re.compile(r'"message"\s*:\s*"([^"]*)"')
+
+class _RateLimited(ValueError):
+    """Réponse NOTOK de dépassement de quota (rejouable)"""
+
+def _stream_text(response):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+def iter_results(response):
+    """Génère les éléments du tableau "result" au fil de la lecture du corps
+
+    Seul le transfert en cours de décodage est gardé en mémoire. Lève
+    ValueError si l'API répond en erreur ; rien si aucun transfert.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _stream_text(response)
+    buf = ""
+    for text in chunks:
+        buf += text
+        match = _RESULT_ARRAY.search(buf)
+        if match:
+            break
+    else:
+        # Pas de tableau : message d'erreur (result est une chaîne)
+        data = json.loads(buf)
+        result = str(data.get("result", ""))
+        if data.get("status") == "0" and "rate limit" in result.lower():
+            raise _RateLimited(result)
+        if data.get("message") == "No transactions found":
+            return
+        raise ValueError(data.get("message") or result or "Erreur inconnue")
+
+    header = buf[:match.start()]
+    status, message = _STATUS.search(header), _MESSAGE.search(header)
+    if status and status.group(1) != "1":
+        if message and message.group(1) == "No transactions found":
+            return
+        raise ValueError(message.group(1) if message else "Erreur inconnue")
+
+    pos = match.end()
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf):
+            if buf[pos] == "]":
+                return
+            try:
+                item, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                pass          # transfert coupé entre deux paquets
+            else:
+                yield item
+                continue
+        text = next(chunks, None)
+        if text is None:
+            raise ValueError("Réponse tokentx tronquée")
+        buf = buf[pos:] + text
+        pos = 0
+
+def iter_range(api_config, wallet_addr, startblock, endblock=END_BLOCK):
+    """Transferts ERC20 du wallet entre deux blocs (inclus), ordre croissant, en streaming"""
+    params = {
+        "module": "account",
+        "action": "tokentx",
+        "address": wallet_addr,
+        "startblock": startblock,
+        "endblock": endblock,
+        "sort": "asc",
+        "apikey": api_config["key"]
+    }
+    for attempt in range(http_client.MAX_RETRIES + 1):
+        with http_client.get(api_config["url"], params=params, timeout=15,
+                             api_key=api_config["key"], stream=True) as response:
+            if not response.ok:
+                raise ValueError(f"HTTP {response.status_code}")
+            try:
+                yield from iter_results(response)
+                return
+            except _RateLimited:
+                # Détecté avant tout transfert : la requête peut être rejouée
+                if attempt == http_client.MAX_RETRIES:
+                    raise
+        time.sleep(http_client.backoff_delay(attempt))
+
+def latest_block(api_config):
+    """Dernier bloc de la chaîne (proxy eth_blockNumber), None si indisponible"""
+    try:
+        response = http_client.get(api_config["url"], params={
+            "module": "proxy",
+            "action": "eth_blockNumber",
+            "apikey": api_config["key"]
+        }, timeout=10, api_key=api_config["key"],
+            retry_on=http_client.etherscan_rate_limited)
+        return int(response.json()["result"], 16)
+    except Exception:
+        return None
+
+def fold_transfer(token_balances, tx, wallet_addr):
+    """Intègre un transfert tokentx dans les balances nets par token"""
+    token_addr = tx.get("contractAddress", "").lower()
+    if not token_addr:
+        return
+    if token_addr not in token_balances:
+        token_balances[token_addr] = {
+            "symbol": tx.get("tokenSymbol", "UNKNOWN"),
+            "decimals": int(tx.get("tokenDecimal", 18)),
+            "name": tx.get("tokenName", "Unknown Token"),
+            "net_balance": 0,
+            "first_block": int(tx.get("blockNumber", 0))
+        }
+    token_balances[token_addr]["last_block"] = int(tx.get("blockNumber", 0))
+
+    # Calculer le balance net (entrées - sorties)
+    value = int(tx.get("value", "0"))
+    if tx.get("to", "").lower() == wallet_addr.lower():
+        # Réception
+        token_balances[token_addr]["net_balance"] += value
+    elif tx.get("from", "").lower() == wallet_addr.lower():
+        # Envoi
+        token_balances[token_addr]["net_balance"] -= value
+
+def fold_range(api_config, wallet_addr, startblock, endblock=END_BLOCK):
+    """Replie en streaming les transferts d'une plage de blocs
+
+    Renvoie (balances partiels, nb de transferts repliés, dernier bloc
+    replié, plafonné). Les transferts du bloc courant sont retenus jusqu'au
+    bloc suivant : si la réponse atteint le plafond, ce dernier bloc (peut-être
+    incomplet) est écarté et la plage n'est couverte que jusqu'au précédent.
+    """
+    balances = {}
+    count = folded = 0
+    last_block = startblock - 1
+    held, held_block = [], None
+    for tx in iter_range(api_config, wallet_addr, startblock, endblock):
+        count += 1
+        block = int(tx["blockNumber"])
+        if block != held_block:
+            for held_tx in held:
+                fold_transfer(balances, held_tx, wallet_addr)
+            if held:
+                folded += len(held)
+                last_block = held_block
+            held, held_block = [], block
+        held.append(tx)
+
+    capped = count >= TOKENTX_MAX_RESULTS
+    if capped and folded == 0 and startblock >= endblock:
+        print(f"  ⚠️  Bloc {startblock}: plus de {TOKENTX_MAX_RESULTS} transferts, historique tronqué")
+        capped = False
+    if not capped:
+        for held_tx in held:
+            fold_transfer(balances, held_tx, wallet_addr)
+        folded += len(held)
+        if held:
+            last_block = held_block
+    return balances, folded, last_block, capped
+
+def _split(startblock, endblock, parts):
+    """Découpe [startblock, endblock] en au plus `parts` plages contiguës"""
+    parts = max(1, min(parts, endblock - startblock + 1))
+    step = (endblock - startblock + 1) // parts
+    bounds = [startblock + i * step for i in range(parts)] + [endblock + 1]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(parts)]
+
+def _shards(startblock, endblock, head, parts):
+    """Shards de [startblock, endblock] ; une plage ouverte est découpée
+    jusqu'au dernier bloc connu, le dernier shard restant ouvert"""
+    if endblock != END_BLOCK:
+        return _split(startblock, endblock, parts)
+    shards = _split(startblock, max(startblock, head), parts)
+    # Blocs produits pendant le téléchargement : couverts par le dernier shard
+    shards[-1] = (shards[-1][0], END_BLOCK)
+    return shards
+
+def _fold_shards(api_config, wallet_addr, shards, head):
+    """Replie les shards en parallèle (au plus TOKENTX_SHARDS requêtes à la fois)
+
+    Renvoie {premier bloc: (balances partiels, nb de transferts, dernier
+    bloc replié)}. La partie non couverte d'un shard plafonné est
+    redécoupée en deux moitiés, remises dans le même pool.
+    """
+    parts = {}
+    with ThreadPoolExecutor(max_workers=TOKENTX_SHARDS, thread_name_prefix="tokentx") as pool:
+        pending = {pool.submit(fold_range, api_config, wallet_addr, *shard): shard
+                   for shard in shards}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                startblock, endblock = pending.pop(future)
+                balances, folded, last_block, capped = future.result()
+                parts[startblock] = (balances, folded, last_block)
+                if capped:
+                    for half in _shards(last_block + 1, endblock, head, 2):
+                        pending[pool.submit(fold_range, api_config, wallet_addr, *half)] = half
+    return parts
+
+def _merge(token_balances, partial):
+    for token_addr, token_info in partial.items():
+        if token_addr in token_balances:
+            known = token_balances[token_addr]
+            known["net_balance"] += token_info["net_balance"]
+            known.setdefault("first_block", token_info["first_block"])
+            known["last_block"] = token_info["last_block"]
+        else:
+            token_balances[token_addr] = token_info
+
+def fold_history(api_config, wallet_addr, startblock=0, token_balances=None):
+    """Replie tous les transferts ERC20 du wallet depuis startblock
+
+    Une première requête couvre l'essentiel des wallets. Si elle atteint
+    le plafond, le reste de la plage est réparti en TOKENTX_SHARDS shards
+    parallèles. Les balances partiels sont ajoutés à token_balances dans
+    l'ordre des blocs. Renvoie (token_balances, nb de transferts, dernier
+    bloc replié) ; lève ValueError si l'API est en erreur.
+    """
+    token_balances = {} if token_balances is None else token_balances
+    balances, folded, last_block, capped = fold_range(api_config, wallet_addr, startblock)
+    parts = {startblock: (balances, folded, last_block)}
+    if capped:
+        head = latest_block(api_config) or END_BLOCK
+        shards = _shards(last_block + 1, END_BLOCK, head, TOKENTX_SHARDS)
+        parts.update(_fold_shards(api_config, wallet_addr, shards, head))
+
+    total = 0
+    for start in sorted(parts):
+        balances, folded, part_last = parts[start]
+        _merge(token_balances, balances)
+        total += folded
+        if folded:
+            # Un shard vide ne fait pas avancer le curseur : sans dernier bloc
+            # connu, les shards vont jusqu'à END_BLOCK, bien au-delà de la chaîne
+            last_block = max(last_block, part_last)
+    return token_balances, total, last_block
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Stockage local persistant par wallet (SQLite, fichier WALLET_STORE_PATH)
+• Curseurs tokentx : dernier bloc traité + balances nets accumulés
+• Index de découverte : tokens connus par (wallet, chaîne), premier et
+  dernier bloc vus, date du dernier rafraîchissement complet
+• Instantanés de positions par chaîne, avec l'empreinte d'état (nonce,
+  dernier transfert ERC20, balance natif) relevée avant le scan
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+STORE_PATH = os.getenv("WALLET_STORE_PATH", "wallet_cache.db")
+
+# Âge (s) au-delà duquel la découverte des tokens est relancée en tâche de fond
+DISCOVERY_MAX_AGE = int(os.getenv("DISCOVERY_MAX_AGE", "900"))
+
+# Âge (s) max d'un instantané réutilisé quand la chaîne n'a pas bougé
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", "1800"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokentx_cursors (
+    wallet      TEXT    NOT NULL,
+    chain_id    INTEGER NOT NULL,
+    last_block  INTEGER NOT NULL,
+    balances    TEXT    NOT NULL,
+    updated_at  REAL    NOT NULL,
+    PRIMARY KEY (wallet, chain_id)
+);
+CREATE TABLE IF NOT EXISTS token_index (
+    wallet       TEXT    NOT NULL,
+    chain_id     INTEGER NOT NULL,
+    token        TEXT    NOT NULL,
+    symbol       TEXT,
+    decimals     INTEGER,
+    first_block  INTEGER,
+    last_block   INTEGER,
+    PRIMARY KEY (wallet, chain_id, token)
+);
+CREATE TABLE IF NOT EXISTS chain_snapshots (
+    wallet       TEXT    NOT NULL,
+    chain_id     INTEGER NOT NULL,
+    fingerprint  TEXT    NOT NULL,
+    positions    TEXT    NOT NULL,
+    saved_at     REAL    NOT NULL,
+    PRIMARY KEY (wallet, chain_id)
+);
+CREATE TABLE IF NOT EXISTS discovery_runs (
+    wallet        TEXT    NOT NULL,
+    chain_id      INTEGER NOT NULL,
+    refreshed_at  REAL    NOT NULL,
+    PRIMARY KEY (wallet, chain_id)
+);
+"""
+
+_init_lock = threading.Lock()
+_initialized = set()
+
+def connect() -> sqlite3.Connection:
+    """Connexion au fichier du store (schéma créé au premier accès)"""
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    with _init_lock:
+        if STORE_PATH not in _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            _initialized.add(STORE_PATH)
+    return conn
+
+def load_cursor(wallet: str, chain_id: int):
+    """(dernier bloc traité, balances nets par token) ; (-1, {}) si jamais synchronisé"""
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT last_block, balances FROM tokentx_cursors WHERE wallet = ? AND chain_id = ?",
+            (wallet.lower(), chain_id)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return -1, {}
+    return row[0], json.loads(row[1])
+
+def save_cursor(wallet: str, chain_id: int, last_block: int, balances: dict):
+    """Enregistre le curseur et l'état accumulé après une synchronisation"""
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tokentx_cursors VALUES (?, ?, ?, ?, ?)",
+                (wallet.lower(), chain_id, last_block, json.dumps(balances), time.time()))
+    finally:
+        conn.close()
+
+def load_tokens(wallet: str, chain_id: int):
+    """Tokens connus {adresse: {symbol, decimals, first_block, last_block}} et
+    date du dernier rafraîchissement complet (None si jamais terminé)"""
+    conn = connect()
+    try:
+        rows = conn.execute(
+            "SELECT token, symbol, decimals, first_block, last_block FROM token_index "
+            "WHERE wallet = ? AND chain_id = ?", (wallet.lower(), chain_id)).fetchall()
+        run = conn.execute(
+            "SELECT refreshed_at FROM discovery_runs WHERE wallet = ? AND chain_id = ?",
+            (wallet.lower(), chain_id)).fetchone()
+    finally:
+        conn.close()
+    tokens = {token: {"symbol": symbol, "decimals": decimals,
+                      "first_block": first_block, "last_block": last_block}
+              for token, symbol, decimals, first_block, last_block in rows}
+    return tokens, run[0] if run else None
+
+def index_entries(tokens, block=None) -> dict:
+    """Entrées de l'index de découverte pour une page addresstokenbalance
+    
+    La page ne donne pas les blocs de transfert : block (bloc épinglé lors de
+    la lecture, None si inconnu) sert de premier et dernier bloc vus ; les
+    blocs de tokentx les élargissent ensuite. Les lignes mal formées (adresse
+    absente, TokenDivisor non entier) sont ignorées une à une, sans faire
+    échouer la page.
+    """
+    entries = {}
+    for t in tokens:
+        try:
+            if not t.get("TokenAddress"):
+                continue
+            entries[t["TokenAddress"].lower()] = {
+                "symbol": t.get("TokenSymbol", "UNKNOWN"),
+                "decimals": int(t.get("TokenDivisor", "18")),
+                "first_block": block,
+                "last_block": block
+            }
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return entries
+
+def record_tokens(wallet: str, chain_id: int, tokens: dict, complete: bool = False):
+    """Ajoute / met à jour des tokens découverts (blocs élargis, jamais réduits)
+
+    complete=True marque la fin d'une découverte complète (date de
+    rafraîchissement), y compris quand aucun token n'a été trouvé.
+    """
+    conn = connect()
+    try:
+        with conn:
+            conn.executemany(
+                """INSERT INTO token_index VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (wallet, chain_id, token) DO UPDATE SET
+                       symbol = excluded.symbol,
+                       decimals = excluded.decimals,
+                       first_block = MIN(COALESCE(first_block, excluded.first_block),
+                                         COALESCE(excluded.first_block, first_block)),
+                       last_block = MAX(COALESCE(last_block, excluded.last_block),
+                                        COALESCE(excluded.last_block, last_block))""",
+                [(wallet.lower(), chain_id, token.lower(), info.get("symbol"),
+                  info.get("decimals"), info.get("first_block"), info.get("last_block"))
+                 for token, info in tokens.items()])
+            if complete:
+                conn.execute("INSERT OR REPLACE INTO discovery_runs VALUES (?, ?, ?)",
+                             (wallet.lower(), chain_id, time.time()))
+    finally:
+        conn.close()
+
+def discovery_stale(refreshed_at) -> bool:
+    """Vrai si la découverte n'a jamais abouti ou date de plus de DISCOVERY_MAX_AGE"""
+    return refreshed_at is None or time.time() - refreshed_at > DISCOVERY_MAX_AGE
+
+def load_snapshot(wallet: str, chain_id: int):
+    """(empreinte, positions, date) du dernier scan de la chaîne, None si aucun"""
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT fingerprint, positions, saved_at FROM chain_snapshots "
+            "WHERE wallet = ? AND chain_id = ?", (wallet.lower(), chain_id)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return json.loads(row[0]), json.loads(row[1]), row[2]
+
+def save_snapshot(wallet: str, chain_id: int, fingerprint, positions: list):
+    """Enregistre les positions d'un scan et l'empreinte relevée avant celui-ci"""
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chain_snapshots VALUES (?, ?, ?, ?, ?)",
+                (wallet.lower(), chain_id, json.dumps(list(fingerprint)),
+                 json.dumps(positions), time.time()))
+    finally:
+        conn.close()
+
+def snapshot_tokens(wallets, chain_id: int) -> set:
+    """Union des tokens des derniers instantanés de plusieurs wallets sur une chaîne"""
+    wallets = [w.lower() for w in wallets]
+    tokens = set()
+    conn = connect()
+    try:
+        for i in range(0, len(wallets), 500):
+            chunk = wallets[i:i + 500]
+            rows = conn.execute(
+                f"SELECT positions FROM chain_snapshots WHERE chain_id = ? "
+                f"AND wallet IN ({','.join('?' * len(chunk))})", (chain_id, *chunk)).fetchall()
+            for (positions,) in rows:
+                tokens.update(p["addr"] for p in json.loads(positions))
+    finally:
+        conn.close()
+    return tokens
+
+def snapshot_fresh(snapshot) -> bool:
+    """Vrai si un instantané existe et a moins de SNAPSHOT_MAX_AGE s"""
+    return snapshot is not None and time.time() - snapshot[2] <= SNAPSHOT_MAX_AGE
+
+def snapshot_matches(snapshot, fingerprint) -> bool:
+    """Vrai si l'instantané est récent et que l'état de la chaîne n'a pas changé"""
+    return (snapshot_fresh(snapshot) and fingerprint is not None
+            and snapshot[0] == list(fingerprint))
+
+def reprice_positions(positions: list, prices: dict) -> list:
+    """Positions d'un instantané revalorisées aux prix courants
+
+    Chaque position garde le prix du scan ("price") ; sans prix courant,
+    la valeur enregistrée est conservée.
+    """
+    rows = []
+    for position in positions:
+        row = {k: v for k, v in position.items() if k != "price"}
+        price = prices.get(position["addr"], 0)
+        if price > 0 and position.get("price", 0) > 0:
+            row["usd"] = position["usd"] * price / position["price"]
+        rows.append(row)
+    return rows